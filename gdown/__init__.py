@@ -1,11 +1,20 @@
 import importlib.metadata
 
 from . import exceptions
+from .aio import acached_download
+from .aio import adownload
+from .aio import adownload_folder
 from .cached_download import cached_download
+from .concurrency import AdaptiveConcurrency
 from .download import download
 from .download_folder import download_folder
+from .download_folder import iter_folder
 from .exceptions import DownloadError
 from .exceptions import FileURLRetrievalError
+from .exceptions import ThrottledError
 from .extractall import extractall
+from .speed_limit import SpeedLimiter
+from .stat import stat
+from .stat import stat_many
 
 __version__ = importlib.metadata.version("gdown")
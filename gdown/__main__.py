@@ -8,12 +8,21 @@ from collections.abc import Sequence
 from typing import Any
 
 import requests
+import tqdm
 
 from . import __version__
+from .cached_download import CACHE_MAX_BYTES_ENV
+from .cached_download import _prune_cache
+from .cached_download import cache_root
 from .download import GoogleDriveFileToDownload
 from .download import download
 from .download_folder import download_folder
 from .exceptions import DownloadError
+from .exceptions import FileURLRetrievalError
+from .speed_limit import SpeedLimiter
+from .stat import FileStat
+from .stat import stat
+from .stat import stat_many
 
 
 class _ShowVersionAction(argparse.Action):
@@ -46,7 +55,63 @@ def file_size(argv: str | None) -> float | None:
         return size
 
 
+# Files to get the size and modified time of at a time for --folder --json,
+# which only sends a small request per file.
+_JSON_STAT_WORKERS = 8
+
+
+def _get_json_entry(file_stat: FileStat, path: str) -> dict[str, Any]:
+    return {
+        "url": f"https://drive.google.com/uc?id={file_stat.id}",
+        "path": path,
+        "size": file_stat.size,
+        "modified_time": None
+        if file_stat.modified_time is None
+        else file_stat.modified_time.isoformat(),
+    }
+
+
+def cache_main(argv: Sequence[str]) -> None:
+    parser = argparse.ArgumentParser(
+        prog="gdown cache", description="inspect and prune ~/.cache/gdown"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    prune_parser = subparsers.add_parser(
+        "prune", help="remove least recently used files over the size budget"
+    )
+    prune_parser.add_argument(
+        "--max-size",
+        type=file_size,
+        help=f"size budget (e.g., '10GB'); default is ${CACHE_MAX_BYTES_ENV}",
+    )
+    args = parser.parse_args(argv)
+
+    max_bytes = os.environ.get(CACHE_MAX_BYTES_ENV)
+    if args.command == "prune":
+        if args.max_size is not None:
+            max_bytes = args.max_size
+        if max_bytes is None:
+            parser.error(f"--max-size or ${CACHE_MAX_BYTES_ENV} is required")
+        evicted, count, total = _prune_cache(max_bytes=int(max_bytes))
+        for path in evicted:
+            print(f"Removed {path}")
+    else:
+        evicted, count, total = _prune_cache(max_bytes=sys.maxsize)
+    print(f"Cache: {cache_root}")
+    print(f"Files: {count}")
+    print(f"Size: {tqdm.tqdm.format_sizeof(total, suffix='B', divisor=1024)}")
+    if max_bytes is not None:
+        print(
+            "Budget: "
+            f"{tqdm.tqdm.format_sizeof(int(max_bytes), suffix='B', divisor=1024)}"
+        )
+
+
 def main() -> None:
+    if sys.argv[1:2] == ["cache"]:
+        cache_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(
         formatter_class=argparse.ArgumentDefaultsHelpFormatter
     )
@@ -80,6 +145,11 @@ def main() -> None:
         type=file_size,
         help="download speed limit in second (e.g., '10MB' -> 10MB/s)",
     )
+    parser.add_argument(
+        "--speed-file",
+        help="share the --speed limit with other gdown processes that use "
+        "the same file",
+    )
     parser.add_argument(
         "--no-cookies",
         action="store_true",
@@ -108,9 +178,9 @@ def main() -> None:
         action="store_true",
         help=(
             "(beta) list file or folder contents as a JSON array on stdout "
-            "instead of downloading. Each entry is an object with 'url' and "
-            "'path'. The output format may change in a future release. "
-            "Cannot be combined with -O/--output."
+            "instead of downloading. Each entry is an object with 'url', "
+            "'path', 'size' and 'modified_time'. The output format may change "
+            "in a future release. Cannot be combined with -O/--output."
         ),
     )
     parser.add_argument(
@@ -122,12 +192,68 @@ def main() -> None:
         "--user-agent",
         help="User-Agent to use for downloading file.",
     )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=1,
+        help="number of parallel connections to download a single file with "
+        "(requires server support for range requests)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="number of times to retry a file download that is throttled or "
+        "whose connection drops, resuming it with exponential backoff",
+    )
+    parser.add_argument(
+        "--url-cache-ttl",
+        type=float,
+        help="reuse download URLs and metadata resolved for Google Drive files "
+        "within this many seconds, skipping the confirmation pages",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        help="number of files to download (default: 1), or with --json to get "
+        f"the size and modified time of (default: {_JSON_STAT_WORKERS}), in "
+        "parallel with --folder",
+    )
+
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="with --folder, download only files that are new or changed since "
+        "the last sync, as recorded in .gdown-manifest.json in the output folder",
+    )
+    parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="with --sync, remove local files that are no longer in the folder "
+        "or were renamed or moved in it",
+    )
 
     args = parser.parse_args()
 
     if args.json and args.output is not None:
         parser.error("--json cannot be combined with -O/--output")
 
+    if (args.sync or args.prune) and not args.folder:
+        parser.error("--sync and --prune require --folder")
+    if args.prune and not args.sync:
+        parser.error("--prune requires --sync")
+    if args.sync and args.json:
+        parser.error("--sync cannot be combined with --json")
+    if args.speed_file is not None and args.speed is None:
+        parser.error("--speed-file requires --speed")
+    if args.connections < 1:
+        parser.error(f"--connections must be positive: {args.connections}")
+    if args.jobs is not None and args.jobs < 1:
+        parser.error(f"--jobs must be positive: {args.jobs}")
+    if args.retries < 0:
+        parser.error(f"--retries must not be negative: {args.retries}")
+
     if args.json and not args.quiet:
         print(
             "warning: `--json` is in beta and its output format may change in a "
@@ -135,6 +261,10 @@ def main() -> None:
             file=sys.stderr,
         )
 
+    speed = args.speed
+    if args.speed_file is not None:
+        speed = SpeedLimiter(speed=args.speed, path=args.speed_file)
+
     if args.output == "-":
         args.output = sys.stdout.buffer
 
@@ -155,39 +285,89 @@ def main() -> None:
                 output=args.output,
                 quiet=args.quiet or args.json,
                 proxy=args.proxy,
-                speed=args.speed,
+                speed=speed,
                 use_cookies=not args.no_cookies,
                 verify=not args.no_check_certificate,
                 user_agent=args.user_agent,
                 resume=args.continue_,
                 skip_download=args.json,
+                max_workers=1 if args.jobs is None else args.jobs,
+                sync=args.sync,
+                prune=args.prune,
+                retries=args.retries,
             )
+        elif args.json:
+            file_stat = stat(
+                url=url,
+                id=id,
+                format=args.format,
+                proxy=args.proxy,
+                use_cookies=not args.no_cookies,
+                verify=not args.no_check_certificate,
+                user_agent=args.user_agent,
+            )
+            if file_stat.id is None or file_stat.name is None:
+                raise FileURLRetrievalError(
+                    "Could not determine the Google Drive filename; --json requires "
+                    f"a resolvable Google Drive file (got: {url or id})"
+                )
         else:
             result = download(
                 url=url,
                 output=args.output,
                 quiet=args.quiet or args.json,
                 proxy=args.proxy,
-                speed=args.speed,
+                speed=speed,
                 use_cookies=not args.no_cookies,
                 verify=not args.no_check_certificate,
                 id=id,
                 resume=args.continue_,
                 format=args.format,
                 user_agent=args.user_agent,
-                skip_download=args.json,
+                connections=args.connections,
+                url_cache_ttl=args.url_cache_ttl,
+                retries=args.retries,
             )
 
         if args.json:
-            files = result if args.folder else [result]
             entries = []
-            for file in files:
-                assert isinstance(file, GoogleDriveFileToDownload)
+            if args.folder:
+                files = [
+                    file
+                    for file in result
+                    if isinstance(file, GoogleDriveFileToDownload)
+                ]
+                file_stats = stat_many(
+                    ids=[file.id for file in files],
+                    max_workers=_JSON_STAT_WORKERS if args.jobs is None else args.jobs,
+                    format=args.format,
+                    proxy=args.proxy,
+                    use_cookies=not args.no_cookies,
+                    verify=not args.no_check_certificate,
+                    user_agent=args.user_agent,
+                    cache_ttl=args.url_cache_ttl,
+                )
+                for file, file_stat in zip(files, file_stats):
+                    if isinstance(file_stat, Exception):
+                        print(
+                            f"Failed to get metadata of {file.path}: {file_stat}",
+                            file=sys.stderr,
+                        )
+                        file_stat = FileStat(
+                            id=file.id,
+                            name=None,
+                            size=None,
+                            modified_time=None,
+                            accept_ranges=None,
+                        )
+                    entries.append(
+                        _get_json_entry(
+                            file_stat=file_stat, path=file.path.replace(os.sep, "/")
+                        )
+                    )
+            else:
                 entries.append(
-                    {
-                        "url": f"https://drive.google.com/uc?id={file.id}",
-                        "path": file.path.replace(os.sep, "/"),
-                    }
+                    _get_json_entry(file_stat=file_stat, path=file_stat.name)
                 )
             print(json.dumps(entries, ensure_ascii=False, indent=2))
     except DownloadError as e:
@@ -0,0 +1,600 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import os
+import os.path as osp
+import shutil
+import sys
+import threading
+from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Any
+from typing import BinaryIO
+from typing import Literal
+from typing import TypeVar
+
+if sys.version_info >= (3, 12):
+    from typing import Unpack
+else:
+    from typing_extensions import Unpack
+
+import requests
+import tqdm
+
+from .cached_download import _DownloadKwargs
+from .cached_download import cached_download
+from .download import _FILE_USER_AGENT
+from .download import _RETRYABLE_ERRORS
+from .download import CHUNK_SIZE
+from .download import GoogleDriveFileToDownload
+from .download import _get_cookies_file
+from .download import _get_filename_from_response
+from .download import _get_hashers
+from .download import _get_modified_time_from_response
+from .download import _get_output_path
+from .download import _get_part_path
+from .download import _get_retry_delay
+from .download import _get_session
+from .download import _get_size_from_response
+from .download import _get_validators
+from .download import _is_part_resumable
+from .download import _iter_body
+from .download import _open_range
+from .download import _raise_for_retryable_status
+from .download import _resolve_file_response
+from .download import _sanitize_filename
+from .download import _update_hashers_from_file
+from .download_folder import _get_download_output
+from .download_folder import _get_folder_session
+from .download_folder import _iter_folder
+from .download_folder import _raise_for_errors
+from .exceptions import DownloadError
+from .json_file import _dump_json_atomic
+from .speed_limit import SpeedLimiter
+
+_R = TypeVar("_R")
+
+
+async def _to_thread(
+    func: Callable[[], _R], on_cancel: Callable[[], None] | None = None
+) -> _R:
+    """Runs func in a worker thread, waiting for it to return even if cancelled.
+
+    On cancellation, on_cancel is called to make func return early, and
+    cancellation is raised once func has returned, so that nothing it uses is
+    closed or unlocked while it still runs.
+    """
+    future = asyncio.ensure_future(asyncio.to_thread(func))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        if on_cancel is not None:
+            on_cancel()
+        with contextlib.suppress(Exception):
+            await future
+        raise
+
+
+def _open_part(part_path: str, resume: bool, validators: dict[str, str]) -> BinaryIO:
+    if not resume:
+        _dump_json_atomic(path=f"{part_path}.json", obj={"validators": validators})
+    return open(part_path, "ab" if resume else "wb")
+
+
+def _truncate(f: BinaryIO) -> None:
+    f.seek(0)
+    f.truncate()
+
+
+def _write_next_chunk(
+    chunks: Iterator[bytes | memoryview],
+    f: BinaryIO,
+    hashers: dict[str, Any],
+) -> int | None:
+    """Receives the next chunk and writes it, returning its size or None at the end."""
+    chunk = next(chunks, None)
+    if chunk is None:
+        return None
+    f.write(chunk)
+    for hasher in hashers.values():
+        hasher.update(chunk)
+    return len(chunk)
+
+
+def _finish_part(f: BinaryIO, part_path: str, output: str, mtime: float | None) -> None:
+    f.close()
+    shutil.move(part_path, output)
+    os.remove(f"{part_path}.json")
+    if mtime is not None:
+        os.utime(output, (mtime, mtime))
+
+
+async def adownload(
+    url: str | None = None,
+    output: str | BinaryIO | None = None,
+    quiet: bool = False,
+    proxy: str | None = None,
+    speed: float | SpeedLimiter | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    id: str | None = None,
+    resume: bool = False,
+    format: str | None = None,
+    user_agent: str | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+    session: requests.Session | None = None,
+    url_cache_ttl: float | None = None,
+    digests: dict[str, str] | None = None,
+    validators: dict[str, str] | None = None,
+    retries: int = 0,
+) -> str | BinaryIO:
+    """Download file from URL in asyncio code.
+
+    The file is resolved and received with requests as by download, but each
+    blocking step (a request, a chunk received and written, a file moved) runs
+    in a worker thread, so the event loop is never blocked and a worker is only
+    taken while a step runs. Cancelling the coroutine closes the connection
+    once the current step ends, and keeps what was written to resume from it.
+
+    Unlike download, it doesn't support connections and pipeline_depth.
+
+    Parameters
+    ----------
+    url:
+        URL. Google Drive URL is also supported.
+    output:
+        Output filename/directory. Default is basename of URL.
+        If output is an existing directory or ends with a path separator,
+        the basename will be appended automatically.
+    quiet:
+        Suppress terminal output. Default is False.
+    proxy:
+        Proxy.
+    speed:
+        Download byte size per second (e.g., 256KB/s = 256 * 1024), or a
+        SpeedLimiter to share with other downloads.
+    use_cookies:
+        Flag to use cookies. Default is True.
+    verify:
+        Either a bool, in which case it controls whether the server's TLS
+        certificate is verified, or a string, in which case it must be a path
+        to a CA bundle to use. Default is True.
+    id:
+        Google Drive's file ID.
+    resume:
+        Resume interrupted downloads while skipping completed ones.
+        Default is False.
+    format:
+        Format of Google Docs, Spreadsheets and Slides. See download.
+    user_agent:
+        User-agent to use in the HTTP request.
+    progress:
+        Callback called after each chunk: ``progress(bytes_so_far, bytes_total)``.
+        *bytes_total* is None when the size is unavailable.
+    session:
+        Session to download the file with. It is left open. Default is a new
+        session.
+    url_cache_ttl:
+        Seconds to reuse the download URL resolved for a Google Drive file.
+        See download.
+    digests:
+        Dictionary whose keys are hash algorithms (e.g., 'sha256') to compute
+        while the file is written. See download.
+    validators:
+        Dictionary updated with the headers of the file response that change
+        with its content. See download.
+    retries:
+        Number of times to retry after the connection drops or the server
+        fails with 429 or 5xx, requesting the rest of the file. Default is 0.
+
+    Returns
+    -------
+    output:
+        Output filename, or output if it is a file object.
+
+    Raises
+    ------
+    ValueError
+        If neither url nor id is specified, or both are specified, or retries
+        is negative, or digests has an unsupported algorithm.
+    FileURLRetrievalError
+        If the file URL cannot be retrieved from Google Drive.
+    DownloadError
+        If the download fails.
+    """
+    if not (id is None) ^ (url is None):
+        raise ValueError("Either url or id has to be specified")
+    if retries < 0:
+        raise ValueError(f"retries must not be negative: {retries}")
+    hashers = _get_hashers(algorithms=digests or ())
+    if id is not None:
+        url = f"https://drive.google.com/uc?id={id}"
+    assert url is not None
+    if speed is not None and not isinstance(speed, SpeedLimiter):
+        speed = SpeedLimiter(speed=speed)
+    chunk_size = CHUNK_SIZE if speed is None else min(CHUNK_SIZE, speed.burst)
+
+    if session is None:
+        sess, cookies_file = _get_session(
+            proxy=proxy,
+            use_cookies=use_cookies,
+            user_agent=_FILE_USER_AGENT if user_agent is None else user_agent,
+        )
+    else:
+        sess, cookies_file = session, _get_cookies_file()
+    res: requests.Response | None = None
+    tmp_file = None
+    f = None
+    try:
+        retry = 0
+        while True:
+            try:
+                resolved = await _to_thread(
+                    functools.partial(
+                        _resolve_file_response,
+                        sess=sess,
+                        url=url,
+                        format=format,
+                        verify=verify,
+                        use_cookies=use_cookies,
+                        cookies_file=cookies_file,
+                        url_cache_ttl=url_cache_ttl,
+                    )
+                )
+                break
+            except _RETRYABLE_ERRORS as e:
+                if retry >= retries:
+                    raise
+                retry += 1
+                await asyncio.sleep(_get_retry_delay(retry=retry, error=e))
+        res, url, url_origin, gdrive_file_id = resolved
+        # Request the rest of the file where the redirects led, with the
+        # cookies they set.
+        file_url = res.url
+        part_validators = _get_validators(response=res)
+        if validators is not None:
+            validators.update(part_validators)
+        total = _get_size_from_response(response=res)
+
+        filename_from_url = None
+        last_modified_time = None
+        if gdrive_file_id:
+            filename_from_url = _get_filename_from_response(response=res)
+            last_modified_time = _get_modified_time_from_response(response=res)
+        if filename_from_url is None:
+            filename_from_url = _sanitize_filename(filename=osp.basename(url))
+        if output is None or isinstance(output, str):
+            output = _get_output_path(output=output, filename=filename_from_url)
+
+        if isinstance(output, str):
+            if resume and osp.isfile(output):
+                if not quiet:
+                    print(f"Skipping already downloaded file {output}", file=sys.stderr)
+                if digests is not None:
+                    await _to_thread(
+                        functools.partial(
+                            _update_hashers_from_file, hashers=hashers, path=output
+                        )
+                    )
+                    for algorithm, hasher in hashers.items():
+                        digests[algorithm] = f"{algorithm}:{hasher.hexdigest()}"
+                return output
+
+            tmp_file = _get_part_path(output=output, source=[url_origin, format])
+            if resume and not _is_part_resumable(
+                part_path=tmp_file, validators=part_validators
+            ):
+                resume = False
+            f = await _to_thread(
+                functools.partial(
+                    _open_part,
+                    part_path=tmp_file,
+                    resume=resume,
+                    validators=part_validators,
+                )
+            )
+            position = f.tell()
+            if position and hashers:
+                await _to_thread(
+                    functools.partial(
+                        _update_hashers_from_file, hashers=hashers, path=tmp_file
+                    )
+                )
+        else:
+            f = output
+            position = 0
+
+        if not quiet:
+            print("Downloading...", file=sys.stderr)
+            if resume:
+                print("Resume:", tmp_file, file=sys.stderr)
+            print("From:", url, file=sys.stderr)
+            to = osp.abspath(output) if isinstance(output, str) else output
+            print(f"To: {to}", file=sys.stderr)
+            pbar = tqdm.tqdm(total=total, unit="B", initial=position, unit_scale=True)
+
+        if position:
+            res.close()
+            res = None
+        retry = 0
+        while position == 0 or position != total:
+            try:
+                if res is None:
+                    res = await _to_thread(
+                        functools.partial(
+                            _open_range,
+                            sess=sess,
+                            url=file_url,
+                            start=position,
+                            end=None,
+                            verify=verify,
+                        )
+                    )
+                if res is None:
+                    if tmp_file is None:
+                        raise DownloadError(
+                            f"Server doesn't serve the rest of the file: {url}"
+                        )
+                    # The range is not served, so download the whole file again.
+                    res = await _to_thread(
+                        functools.partial(
+                            sess.get, file_url, stream=True, verify=verify
+                        )
+                    )
+                    _raise_for_retryable_status(response=res)
+                    await _to_thread(functools.partial(_truncate, f))
+                    hashers = _get_hashers(algorithms=digests or ())
+                    position = 0
+                    if not quiet:
+                        pbar.reset(total=total)
+                chunks = _iter_body(res=res, chunk_size=chunk_size)
+                while (
+                    size := await _to_thread(
+                        functools.partial(
+                            _write_next_chunk, chunks=chunks, f=f, hashers=hashers
+                        ),
+                        on_cancel=res.close,
+                    )
+                ) is not None:
+                    position += size
+                    if not quiet:
+                        pbar.update(size)
+                    if progress is not None:
+                        progress(position, total)
+                    if speed is not None:
+                        await speed.aconsume(size)
+            except _RETRYABLE_ERRORS as e:
+                if res is not None:
+                    res.close()
+                    res = None
+                if retry >= retries:
+                    raise
+                retry += 1
+                await asyncio.sleep(_get_retry_delay(retry=retry, error=e))
+                continue
+            break
+
+        if digests is not None:
+            for algorithm, hasher in hashers.items():
+                digests[algorithm] = f"{algorithm}:{hasher.hexdigest()}"
+        if not quiet:
+            pbar.close()
+        if tmp_file:
+            assert isinstance(output, str)
+            await _to_thread(
+                functools.partial(
+                    _finish_part,
+                    f=f,
+                    part_path=tmp_file,
+                    output=output,
+                    mtime=None
+                    if last_modified_time is None
+                    else last_modified_time.timestamp(),
+                )
+            )
+    finally:
+        if res is not None:
+            res.close()
+        if tmp_file is not None and f is not None:
+            # Keep what was written to resume from it.
+            f.close()
+        if session is None:
+            sess.close()
+
+    return output
+
+
+async def adownload_folder(
+    url: str | None = None,
+    id: str | None = None,
+    output: str | None = None,
+    quiet: bool = False,
+    proxy: str | None = None,
+    speed: float | SpeedLimiter | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    user_agent: str | None = None,
+    resume: bool = False,
+    max_workers: int = 1,
+    retries: int = 0,
+) -> list[str]:
+    """Downloads entire folder from URL in asyncio code.
+
+    The folder is listed in a worker thread, and its files are downloaded with
+    adownload as they are listed, at most max_workers at a time. Cancelling the
+    coroutine cancels the downloads and waits for them to stop.
+
+    Parameters
+    ----------
+    url:
+        URL of the Google Drive folder.
+        Must be of the format 'https://drive.google.com/drive/folders/{url}'.
+    id:
+        Google Drive's folder ID.
+    output:
+        String containing the path of the output folder.
+        Defaults to current working directory.
+    quiet:
+        Suppress terminal output.
+    proxy:
+        Proxy.
+    speed:
+        Download byte size per second (e.g., 256KB/s = 256 * 1024), shared by
+        all files, or a SpeedLimiter to share with other downloads.
+    use_cookies:
+        Flag to use cookies. Default is True.
+    verify:
+        Either a bool, in which case it controls whether the server's TLS
+        certificate is verified, or a string, in which case it must be a path
+        to a CA bundle to use. Default is True.
+    user_agent:
+        User-agent to use in the HTTP request.
+    resume:
+        Resume interrupted transfers. Completed output files will be skipped.
+        Default is False.
+    max_workers:
+        Number of folders to list and files to download at a time. Default is 1.
+    retries:
+        Number of times to retry each file when its download is throttled or
+        its connection drops. Default is 0.
+
+    Returns
+    -------
+    files:
+        List of local file paths downloaded.
+
+    Raises
+    ------
+    ValueError
+        If neither url nor id is specified, or both are specified, or
+        max_workers is not positive.
+    DownloadError
+        If any file in the folder fails to download. The other files are
+        still downloaded, and the error lists every failed file.
+    """
+    sess, folder_id = _get_folder_session(
+        url=url,
+        id=id,
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=user_agent,
+        max_workers=max_workers,
+    )
+    if speed is not None and not isinstance(speed, SpeedLimiter):
+        speed = SpeedLimiter(speed=speed)
+    if not quiet:
+        print("Retrieving folder contents", file=sys.stderr)
+    entries = _iter_folder(
+        sess=sess,
+        folder_id=folder_id,
+        output=output,
+        quiet=quiet,
+        verify=verify,
+        max_workers=max_workers,
+    )
+    file_sess, _ = _get_session(
+        proxy=proxy, use_cookies=use_cookies, user_agent=_FILE_USER_AGENT
+    )
+    semaphore = asyncio.Semaphore(max_workers)
+
+    def next_entry() -> tuple[tuple[int, ...], GoogleDriveFileToDownload] | None:
+        return next(entries, None)
+
+    async def download_file(file: GoogleDriveFileToDownload) -> str:
+        async with semaphore:
+            local_path = await adownload(
+                url="https://drive.google.com/uc?id=" + file.id,
+                output=_get_download_output(file=file),
+                quiet=quiet or max_workers > 1,
+                speed=speed,
+                use_cookies=use_cookies,
+                verify=verify,
+                resume=resume,
+                session=file_sess,
+                retries=retries,
+            )
+        assert isinstance(local_path, str)
+        return local_path
+
+    # Files are downloaded while the rest of the tree is still being listed,
+    # so keep their positions to return them in listing order.
+    files: list[tuple[tuple[int, ...], GoogleDriveFileToDownload]] = []
+    tasks: list[asyncio.Task[str]] = []
+    try:
+        while True:
+            # Cancelling waits for the listing thread, which uses sess.
+            entry = await _to_thread(next_entry)
+            if entry is None:
+                break
+            position, file = entry
+            if file.id is None:  # folder
+                os.makedirs(file.local_path, exist_ok=True)
+                continue
+            files.append((position, file))
+            tasks.append(asyncio.create_task(download_file(file)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Wait for the downloads to stop before closing their session.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        file_sess.close()
+        sess.close()
+
+    errors = [
+        (file, result)
+        for (_, file), result in zip(files, results)
+        if isinstance(result, BaseException)
+    ]
+    _raise_for_errors(errors=errors, n_files=len(files))
+    if not quiet:
+        print("Download completed", file=sys.stderr)
+    local_paths = [result for result in results if isinstance(result, str)]
+    order = sorted(range(len(files)), key=lambda i: files[i][0])
+    return [local_paths[i] for i in order]
+
+
+async def acached_download(
+    url: str | None = None,
+    path: str | None = None,
+    quiet: bool = False,
+    postprocess: Callable[[str], object] | None = None,
+    postprocess_key: str | None = None,
+    hash: str | None = None,
+    verify_hash: Literal["stat", "always"] = "stat",
+    cache_max_bytes: int | None = None,
+    revalidate: bool = False,
+    max_age: float | None = None,
+    **kwargs: Unpack[_DownloadKwargs],
+) -> str:
+    """Cached download from URL in asyncio code.
+
+    Runs cached_download in a worker thread, as the cache is shared with other
+    processes through file locks. Cancelling the coroutine stops the download
+    at the next chunk, and waits for it to stop and release its locks.
+
+    See cached_download for the parameters.
+    """
+    stop = kwargs.get("stop") or threading.Event()
+    kwargs["stop"] = stop
+    return await _to_thread(
+        functools.partial(
+            cached_download,
+            url=url,
+            path=path,
+            quiet=quiet,
+            postprocess=postprocess,
+            postprocess_key=postprocess_key,
+            hash=hash,
+            verify_hash=verify_hash,
+            cache_max_bytes=cache_max_bytes,
+            revalidate=revalidate,
+            max_age=max_age,
+            **kwargs,
+        ),
+        on_cancel=stop.set,
+    )
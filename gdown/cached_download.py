@@ -1,12 +1,22 @@
 from __future__ import annotations
 
+import contextlib
+import functools
 import hashlib
+import inspect
+import json
 import os
 import os.path as osp
+import re
 import shutil
 import sys
 import tempfile
+import threading
+import time
 from collections.abc import Callable
+from collections.abc import Iterator
+from typing import Any
+from typing import Literal
 from typing import TypedDict
 
 if sys.version_info >= (3, 12):
@@ -15,13 +25,21 @@ else:
     from typing_extensions import Unpack
 
 import filelock
+import requests
 
+from .concurrency import AdaptiveConcurrency
+from .download import _get_validators
+from .download import _probe_file
 from .download import download
+from .exceptions import FileURLRetrievalError
+from .json_file import _dump_json_atomic
+from .parse_url import parse_url
+from .speed_limit import SpeedLimiter
 
 
 class _DownloadKwargs(TypedDict, total=False):
     proxy: str | None
-    speed: float | None
+    speed: float | SpeedLimiter | None
     use_cookies: bool
     verify: bool | str
     id: str | None
@@ -29,8 +47,19 @@ class _DownloadKwargs(TypedDict, total=False):
     format: str | None
     user_agent: str | None
     progress: Callable[[int, int | None], None] | None
+    connections: int
+    retries: int
+    concurrency: AdaptiveConcurrency | None
+    pipeline_depth: int
+    session: requests.Session | None
+    url_cache_ttl: float | None
+    stop: threading.Event | None
 
 
+CACHE_MAX_BYTES_ENV = "GDOWN_CACHE_MAX_BYTES"
+
+_CACHE_HITS_MAX_BYTES = 1024 * 1024
+
 cache_root = osp.join(osp.expanduser("~"), ".cache/gdown")
 if not osp.exists(cache_root):
     try:
@@ -44,7 +73,12 @@ def cached_download(
     path: str | None = None,
     quiet: bool = False,
     postprocess: Callable[[str], object] | None = None,
+    postprocess_key: str | None = None,
     hash: str | None = None,
+    verify_hash: Literal["stat", "always"] = "stat",
+    cache_max_bytes: int | None = None,
+    revalidate: bool = False,
+    max_age: float | None = None,
     **kwargs: Unpack[_DownloadKwargs],
 ) -> str:
     """Cached download from URL.
@@ -58,10 +92,41 @@ def cached_download(
     quiet:
         Suppress terminal output. Default is False.
     postprocess:
-        Function called with filename as postprocess.
+        Function called with filename as postprocess, e.g., to extract it. It
+        runs once per file: its completion is recorded with the file's hash
+        (or size, mtime and inode if no hash is given), so it runs again only
+        if it didn't complete or the file changed.
+    postprocess_key:
+        Identifies postprocess in the record of its completion. Default is the
+        module and name of postprocess, with the arguments of a
+        functools.partial. A postprocess that can't be identified so, e.g., a
+        lambda, a closure or a bound method, runs only after the file is
+        downloaded, and isn't run again if it didn't complete, unless
+        postprocess_key is given.
     hash:
         Hash value of file in the format of {algorithm}:{hash_value}
         such as sha256:abcdef.... Supported algorithms: md5, sha1, sha256, sha512.
+        The file is stored once in ~/.cache/gdown/objects by its hash, and
+        hardlinked (or copied) to path, so the same file downloaded through
+        different URLs or to different paths is downloaded and stored once.
+    verify_hash:
+        How to verify the hash of an existing file. 'stat' hashes it only if
+        its size, mtime or inode changed since it was last verified, and
+        'always' hashes it on every call. Default is 'stat'.
+    cache_max_bytes:
+        Size budget of the files downloaded into ~/.cache/gdown. After a new
+        file is cached, least recently used ones are removed to fit it. Files
+        being downloaded or verified by another caller are never removed.
+        Default is the GDOWN_CACHE_MAX_BYTES environment variable, or no limit.
+    revalidate:
+        Check if an existing file changed on the server, comparing its ETag,
+        Last-Modified and Content-Length with those of the download, and
+        download it again if so. The check requests the file without reading
+        its body. Without a hash, a file stored by its hash from the same URL
+        or ID is reused if the server still has the same file. Default is False.
+    max_age:
+        Seconds to trust an existing file after it was downloaded or last
+        checked before revalidating it. Implies revalidate. Default is None.
     kwargs:
         Keyword arguments to be passed to `download`.
 
@@ -73,7 +138,8 @@ def cached_download(
     Raises
     ------
     ValueError
-        If url is not specified when path is not specified.
+        If url is not specified when path is not specified, or if revalidate
+        or max_age is combined with hash.
     DownloadError
         If the download fails.
     """
@@ -87,53 +153,553 @@ def cached_download(
             .replace("?", "-QUESTION-")
         )
         path = osp.join(cache_root, path)
+    revalidate = revalidate or max_age is not None
+    if revalidate and hash:
+        raise ValueError("revalidate and max_age can't be combined with hash")
 
-    # check existence
-    if osp.exists(path) and not hash:
-        if not quiet:
-            print(f"File exists: {path}", file=sys.stderr)
-        return path
-    elif osp.exists(path) and hash:
-        try:
-            _assert_filehash(path=path, hash=hash)
+    download_kwargs = _DownloadKwargs(**kwargs)
+
+    postprocess_id = None
+    if postprocess is not None:
+        postprocess_id = postprocess_key or _get_postprocess_id(postprocess)
+
+    # check existence, leased so that the file isn't evicted until returned
+    with _lease(path=path):
+        cached = _is_cached(
+            path=path, hash=hash, verify_hash=verify_hash, quiet=quiet
+        ) and (
+            not revalidate
+            or _is_unchanged(
+                path=path,
+                url=url,
+                max_age=max_age,
+                quiet=quiet,
+                kwargs=download_kwargs,
+            )
+        )
+        if cached and (
+            postprocess_id is None
+            or _is_postprocessed(path=path, postprocess_id=postprocess_id, hash=hash)
+        ):
+            _record_cache_hit(path=path)
             return path
-        except AssertionError as e:
-            print(e, file=sys.stderr)
+    signature = _get_file_signature(path=path) if osp.exists(path) else None
 
-    # download
-    lock_path = osp.join(cache_root, "_dl_lock")
+    # download and postprocess, once per path across threads and processes
     try:
         os.makedirs(osp.dirname(path))
     except OSError:
         pass
+    with filelock.FileLock(_get_lock_path(path=path)):
+        if (
+            not cached
+            and osp.exists(path)
+            and _get_file_signature(path=path) != signature
+            and _is_cached(path=path, hash=hash, verify_hash=verify_hash, quiet=quiet)
+        ):
+            # Another caller downloaded the file while we waited for the lock.
+            cached = True
+        if cached:
+            _record_cache_hit(path=path)
+        else:
+            _download_to_cache(
+                url=url,
+                path=path,
+                quiet=quiet,
+                hash=hash,
+                revalidate=revalidate,
+                cache_max_bytes=cache_max_bytes,
+                kwargs=download_kwargs,
+            )
+
+        if postprocess is not None and postprocess_id is not None:
+            if not _is_postprocessed(
+                path=path, postprocess_id=postprocess_id, hash=hash
+            ):
+                postprocess(path)
+                _record_postprocessed(
+                    path=path, postprocess_id=postprocess_id, hash=hash
+                )
+        elif postprocess is not None and not cached:
+            # Its completion can't be recorded, so it runs after downloads only.
+            postprocess(path)
+
+    return path
+
+
+def _download_to_cache(
+    url: str | None,
+    path: str,
+    quiet: bool,
+    hash: str | None,
+    revalidate: bool,
+    cache_max_bytes: int | None,
+    kwargs: _DownloadKwargs,
+) -> None:
+    """Downloads the file to path. Must be called with the lock of path held."""
+    ref_key = _get_ref_key(url=url, id=kwargs.get("id"), format=kwargs.get("format"))
+    if hash is None:
+        # Reuse the content downloaded with a hash through another URL of the
+        # same file, only if the server confirms it is unchanged since.
+        ref = _get_ref(key=ref_key) if revalidate else None
+        linked = False
+        if ref is not None and _is_ref_current(
+            url=url, ref=ref, quiet=quiet, kwargs=kwargs
+        ):
+            object_path = _get_object_path(hash=ref["hash"])
+            with filelock.FileLock(_get_lock_path(path=object_path)):
+                linked = _link_object(path=path, hash=ref["hash"])
+        if linked:
+            assert ref is not None
+            _record_validators(path=path, validators=ref["validators"])
+        else:
+            validators: dict[str, str] = {}
+            _download_verified(
+                url=url,
+                output=path,
+                hash=None,
+                quiet=quiet,
+                kwargs=kwargs,
+                validators=validators,
+            )
+            _record_validators(path=path, validators=validators)
+    else:
+        object_path = _get_object_path(hash=hash)
+        with filelock.FileLock(_get_lock_path(path=object_path)):
+            if not _is_cached(
+                path=object_path, hash=hash, verify_hash="stat", quiet=True
+            ):
+                validators = {}
+                _download_verified(
+                    url=url,
+                    output=object_path,
+                    hash=hash,
+                    quiet=quiet,
+                    kwargs=kwargs,
+                    log_output=path,
+                    validators=validators,
+                )
+                _record_hash(path=object_path, hash=hash)
+                _set_ref(key=ref_key, hash=hash, validators=validators)
+            if not _link_object(path=path, hash=hash):
+                raise OSError(f"Failed to materialize {object_path} at {path}")
+    if cache_max_bytes is None and os.environ.get(CACHE_MAX_BYTES_ENV):
+        cache_max_bytes = int(os.environ[CACHE_MAX_BYTES_ENV])
+    _record_cache_access(path=path, max_bytes=cache_max_bytes)
+
+
+def _download_verified(
+    url: str | None,
+    output: str,
+    hash: str | None,
+    quiet: bool,
+    kwargs: _DownloadKwargs,
+    log_output: str | None = None,
+    validators: dict[str, str] | None = None,
+) -> None:
+    """Downloads to output atomically, and checks its hash if given."""
     temp_root = tempfile.mkdtemp(dir=cache_root)
     try:
         temp_path = osp.join(temp_root, "dl")
 
         log_message_hash = f"Hash: {hash}\n" if hash else ""
+        # Hash the file while it is written instead of reading it again.
+        digests = {}
+        if hash:
+            digests[_get_hash_algorithm(hash=hash)] = ""
         download(
             url=url,
             output=temp_path,
             quiet=quiet,
             log_messages={
                 "start": f"Cached downloading...\n{log_message_hash}",
-                "output": f"To: {path}\n",
+                "output": f"To: {log_output or output}\n",
             },
+            digests=digests,
+            validators=validators,
             **kwargs,
         )
         if hash:
-            _assert_filehash(path=temp_path, hash=hash)
-        with filelock.FileLock(lock_path):
-            shutil.move(temp_path, path)
-    except Exception:
-        shutil.rmtree(temp_root)
-        raise
-
-    # postprocess
-    if postprocess is not None:
-        postprocess(path)
+            _assert_hash_matches(
+                hash_actual=digests[_get_hash_algorithm(hash=hash)], hash=hash
+            )
+        # Stage next to output, so that readers never see a partial file.
+        os.makedirs(osp.dirname(output), exist_ok=True)
+        staged_path = f"{output}.{osp.basename(temp_root)}.tmp"
+        shutil.move(temp_path, staged_path)
+        os.replace(staged_path, output)
+    finally:
+        shutil.rmtree(temp_root, ignore_errors=True)
 
-    return path
+
+def _get_object_path(hash: str) -> str:
+    """Returns the path in the content-addressed store of a file with hash."""
+    algorithm = _get_hash_algorithm(hash=hash)
+    hash_value = hash.split(":", 1)[1]
+    if not re.fullmatch("[0-9a-f]{3,}", hash_value):
+        raise ValueError(f"Invalid hash: {hash}. Hash value must be hexadecimal.")
+    return osp.join(cache_root, "objects", algorithm, hash_value[:2], hash_value[2:])
+
+
+def _link_object(path: str, hash: str) -> bool:
+    """Materializes the stored object with hash at path.
+
+    Must be called with the object lock held. The object is hardlinked, or
+    copied if the filesystem doesn't support it. Returns False if there is no
+    object with a verified hash.
+    """
+    object_path = _get_object_path(hash=hash)
+    if osp.abspath(object_path) == osp.abspath(path):
+        return _is_cached(path=path, hash=hash, verify_hash="stat", quiet=True)
+    if not _is_cached(path=object_path, hash=hash, verify_hash="stat", quiet=True):
+        return False
+
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    staged_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(object_path, staged_path)
+    except OSError:
+        shutil.copy2(object_path, staged_path)
+    os.replace(staged_path, path)
+    _record_hash(path=path, hash=hash)
+    _record_cache_access(path=object_path)
+    return True
+
+
+def _get_ref_key(url: str | None, id: str | None, format: str | None) -> str | None:
+    """Returns the key of a file that is the same across its URL forms."""
+    if id is None and url is not None:
+        id, _ = parse_url(url=url)
+    if id is not None:
+        return json.dumps(["drive", id, format])
+    if url is not None:
+        return json.dumps(["url", url])
+    return None
+
+
+def _get_ref_path(key: str) -> str:
+    return osp.join(
+        cache_root, "_refs", hashlib.sha256(key.encode()).hexdigest() + ".json"
+    )
+
+
+def _get_ref(key: str | None) -> dict[str, Any] | None:
+    """Returns the hash and validators of the file last downloaded with key."""
+    if key is None:
+        return None
+    try:
+        with open(_get_ref_path(key=key)) as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get("key") != key or not record.get("validators"):
+        return None
+    return record
+
+
+def _set_ref(key: str | None, hash: str, validators: dict[str, str]) -> None:
+    if key is None:
+        return
+    # The reference only saves downloads, so failing to write it is not an error.
+    try:
+        _dump_json_atomic(
+            path=_get_ref_path(key=key),
+            obj={"key": key, "hash": hash, "validators": validators},
+        )
+    except OSError:
+        pass
+
+
+def _is_ref_current(
+    url: str | None, ref: dict[str, Any], quiet: bool, kwargs: _DownloadKwargs
+) -> bool:
+    """Checks if the server still has the file that ref was downloaded from."""
+    try:
+        validators = _get_current_validators(url=url, kwargs=kwargs)
+    except (requests.exceptions.RequestException, FileURLRetrievalError):
+        return False
+    return validators is not None and _validators_match(
+        recorded=ref["validators"], current=validators
+    )
+
+
+def _is_cached(
+    path: str, hash: str | None, verify_hash: Literal["stat", "always"], quiet: bool
+) -> bool:
+    if not osp.exists(path):
+        return False
+    if not hash:
+        if not quiet:
+            print(f"File exists: {path}", file=sys.stderr)
+        return True
+    if verify_hash == "stat" and _is_hash_recorded(path=path, hash=hash):
+        return True
+    try:
+        _assert_filehash(path=path, hash=hash)
+    except AssertionError as e:
+        print(e, file=sys.stderr)
+        return False
+    _record_hash(path=path, hash=hash)
+    return True
+
+
+def _get_lock_path(path: str) -> str:
+    key = hashlib.sha256(osp.abspath(path).encode()).hexdigest()
+    lock_root = osp.join(cache_root, "_locks")
+    os.makedirs(lock_root, exist_ok=True)
+    return osp.join(lock_root, f"{key}.lock")
+
+
+@contextlib.contextmanager
+def _lease(path: str) -> Iterator[None]:
+    """Keeps the file at path from being evicted while the context is active.
+
+    Unlike the lock of path, a lease can be held by any number of callers at a
+    time, e.g., to verify the file and return it. It is taken under the lock
+    of path, which eviction holds while it checks for leases, so eviction
+    either sees it or has completed.
+    """
+    lease_root = f"{_get_lock_path(path=path)}.leases"
+    os.makedirs(lease_root, exist_ok=True)
+    lease_path = osp.join(lease_root, f"{os.getpid()}-{threading.get_ident()}.lock")
+    lease = filelock.FileLock(lease_path)
+    with filelock.FileLock(_get_lock_path(path=path)):
+        lease.acquire()
+    try:
+        yield
+    finally:
+        lease.release()
+        try:
+            os.remove(lease_path)
+        except OSError:
+            pass
+
+
+def _is_leased(path: str) -> bool:
+    """Checks if a lease is held on path. Must be called with its lock held."""
+    lease_root = f"{_get_lock_path(path=path)}.leases"
+    try:
+        lease_names = os.listdir(lease_root)
+    except OSError:
+        return False
+    for lease_name in lease_names:
+        lease_path = osp.join(lease_root, lease_name)
+        try:
+            with filelock.FileLock(lease_path, timeout=0):
+                pass
+        except filelock.Timeout:
+            return True
+        # Left by a caller that exited while holding it.
+        try:
+            os.remove(lease_path)
+        except OSError:
+            pass
+    return False
+
+
+def _get_cache_key(path: str) -> str | None:
+    """Returns the path of a file relative to cache_root, if it is in it."""
+    try:
+        relpath = osp.relpath(osp.abspath(path), osp.abspath(cache_root))
+    except ValueError:  # on different drives on Windows
+        return None
+    if relpath.startswith((os.pardir, "_")) or osp.isabs(relpath):
+        return None
+    return relpath
+
+
+def _load_cache_index() -> dict[str, dict[str, Any]]:
+    """Loads the index, with the cache hits logged since it was last written.
+
+    Must be called with the index lock held, and the index written after.
+    """
+    try:
+        with open(osp.join(cache_root, "_index.json")) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+    for key, accessed in _pop_cache_hits().items():
+        _index_cache_access(
+            index=index, path=osp.join(cache_root, key), accessed=accessed
+        )
+    return index
+
+
+def _get_linked_object_path(path: str) -> str | None:
+    """Returns the stored object that the file at path is a hardlink of, if any."""
+    try:
+        if os.stat(path).st_nlink < 2:
+            return None
+        with open(_get_hash_record_path(path=path)) as f:
+            record = json.load(f)
+        object_path = _get_object_path(hash=record["hash"])
+        if osp.abspath(object_path) == osp.abspath(path) or not osp.samefile(
+            path, object_path
+        ):
+            return None
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    return object_path
+
+
+def _index_cache_access(
+    index: dict[str, dict[str, Any]], path: str, accessed: float
+) -> str | None:
+    """Records an access to a cached file in index, and returns its key.
+
+    A file hardlinked to a stored object is recorded as a link of the object,
+    so that their bytes are counted once and they are evicted together.
+    """
+    key = _get_cache_key(path=path)
+    link_key = None
+    object_path = _get_linked_object_path(path=path)
+    if object_path is not None:
+        key, link_key = _get_cache_key(path=object_path), key
+    if key is None:
+        return None
+    try:
+        size = osp.getsize(path)
+    except OSError:
+        return None
+    entry = index.get(key, {})
+    links = set(entry.get("links", []))
+    if link_key is not None:
+        links.add(link_key)
+        # Indexed as a file of its own before it was linked.
+        index.pop(link_key, None)
+    index[key] = {"size": size, "accessed": max(accessed, entry.get("accessed", 0))}
+    if links:
+        index[key]["links"] = sorted(links)
+    return key
+
+
+def _record_cache_access(path: str, max_bytes: int | None = None) -> None:
+    """Records an access to a cached file and evicts files over max_bytes."""
+    if _get_cache_key(path=path) is None:
+        return
+    with filelock.FileLock(osp.join(cache_root, "_index.lock")):
+        index = _load_cache_index()
+        key = _index_cache_access(index=index, path=path, accessed=time.time())
+        if max_bytes is not None and key is not None:
+            _evict_cache_entries(index=index, max_bytes=max_bytes, keep={key})
+        _dump_json_atomic(path=osp.join(cache_root, "_index.json"), obj=index)
+
+
+def _record_cache_hit(path: str) -> None:
+    """Records an access to a cached file without rewriting the index.
+
+    Hits are appended to a log that is merged into the index when it is next
+    written, so that they don't contend for the index lock. The log is merged
+    here when it grows over _CACHE_HITS_MAX_BYTES and the lock is free.
+    """
+    key = _get_cache_key(path=path)
+    if key is None:
+        return
+    hits_path = osp.join(cache_root, "_hits.jsonl")
+    # The access time only orders eviction, so failing to log it is not an error.
+    try:
+        with open(hits_path, "a") as f:
+            f.write(json.dumps([key, time.time()]) + "\n")
+        if osp.getsize(hits_path) <= _CACHE_HITS_MAX_BYTES:
+            return
+        with filelock.FileLock(osp.join(cache_root, "_index.lock"), timeout=0):
+            _dump_json_atomic(
+                path=osp.join(cache_root, "_index.json"), obj=_load_cache_index()
+            )
+    except (OSError, filelock.Timeout):
+        pass
+
+
+def _pop_cache_hits() -> dict[str, float]:
+    """Takes the logged cache hits, as the last access time of each file."""
+    hits_path = osp.join(cache_root, "_hits.jsonl")
+    # Hits logged after the log is moved away go to a new log.
+    popped_path = f"{hits_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.replace(hits_path, popped_path)
+    except OSError:
+        return {}
+    hits: dict[str, float] = {}
+    try:
+        with open(popped_path) as f:
+            for line in f:
+                try:
+                    key, accessed = json.loads(line)
+                except (ValueError, TypeError):
+                    # A line truncated by a crash while writing it.
+                    continue
+                hits[key] = max(accessed, hits.get(key, accessed))
+        os.remove(popped_path)
+    except OSError:
+        pass
+    return hits
+
+
+def _evict_cache_entries(
+    index: dict[str, dict[str, Any]], max_bytes: int, keep: set[str]
+) -> list[str]:
+    """Removes least recently used files in index until they fit in max_bytes.
+
+    Must be called with the index lock held. A stored object is removed with
+    its hardlinks in the cache. Files whose lock or a lease is held, i.e., that
+    are being downloaded, verified or returned, are skipped.
+    """
+    for key in [key for key in index if not osp.exists(osp.join(cache_root, key))]:
+        del index[key]
+
+    evicted = []
+    total = sum(entry["size"] for entry in index.values())
+    for key in sorted(index, key=lambda key: index[key]["accessed"]):
+        if total <= max_bytes:
+            break
+        if key in keep:
+            continue
+        path = osp.join(cache_root, key)
+        # Links replaced with other files since are left alone.
+        paths = [
+            link_path
+            for link_path in (
+                osp.join(cache_root, link) for link in index[key].get("links", [])
+            )
+            if osp.exists(link_path) and osp.samefile(link_path, path)
+        ] + [path]
+        try:
+            with contextlib.ExitStack() as stack:
+                for path_i in paths:
+                    stack.enter_context(
+                        filelock.FileLock(_get_lock_path(path=path_i), timeout=0)
+                    )
+                if any(_is_leased(path=path_i) for path_i in paths):
+                    continue
+                for path_i in paths:
+                    os.remove(path_i)
+                    evicted.append(path_i)
+        except (filelock.Timeout, OSError):
+            # On Windows, a file open for reading can't be removed either.
+            continue
+        for path_i in paths:
+            for record_path in [
+                _get_hash_record_path(path=path_i),
+                _get_validators_record_path(path=path_i),
+            ]:
+                try:
+                    os.remove(record_path)
+                except OSError:
+                    pass
+        total -= index.pop(key)["size"]
+    return evicted
+
+
+def _prune_cache(max_bytes: int) -> tuple[list[str], int, int]:
+    """Evicts cached files over max_bytes.
+
+    Returns the evicted files, and the number and total size of remaining ones.
+    """
+    with filelock.FileLock(osp.join(cache_root, "_index.lock")):
+        index = _load_cache_index()
+        evicted = _evict_cache_entries(index=index, max_bytes=max_bytes, keep=set())
+        _dump_json_atomic(path=osp.join(cache_root, "_index.json"), obj=index)
+    return evicted, len(index), sum(int(entry["size"]) for entry in index.values())
 
 
 def _compute_filehash(path: str, algorithm: str) -> str:
@@ -152,17 +718,215 @@ def _compute_filehash(path: str, algorithm: str) -> str:
     return f"{algorithm}:{algorithm_instance.hexdigest()}"
 
 
-def _assert_filehash(path: str, hash: str) -> None:
+def _get_hash_algorithm(hash: str) -> str:
     if ":" not in hash:
         raise ValueError(
             f"Invalid hash: {hash}. "
             "Hash must be in the format of {algorithm}:{hash_value}."
         )
-    algorithm = hash.split(":")[0]
+    return hash.split(":")[0]
+
+
+def _assert_filehash(path: str, hash: str) -> None:
+    algorithm = _get_hash_algorithm(hash=hash)
 
     hash_actual = _compute_filehash(path=path, algorithm=algorithm)
 
+    _assert_hash_matches(hash_actual=hash_actual, hash=hash)
+
+
+def _assert_hash_matches(hash_actual: str, hash: str) -> None:
     if hash_actual != hash:
         raise AssertionError(
             f"File hash doesn't match:\nactual: {hash_actual}\nexpected: {hash}"
         )
+
+
+def _get_hash_record_path(path: str) -> str:
+    key = hashlib.sha256(osp.abspath(path).encode()).hexdigest()
+    return osp.join(cache_root, "_hashes", f"{key}.json")
+
+
+def _get_file_signature(path: str) -> list[int]:
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_dev]
+
+
+def _is_hash_recorded(path: str, hash: str) -> bool:
+    """Checks if the file was verified against hash and is unchanged since."""
+    try:
+        with open(_get_hash_record_path(path=path)) as f:
+            record = json.load(f)
+        signature = _get_file_signature(path=path)
+    except (OSError, ValueError):
+        return False
+    return (
+        record.get("path") == osp.abspath(path)
+        and record.get("hash") == hash
+        and record.get("signature") == signature
+    )
+
+
+def _record_hash(path: str, hash: str) -> None:
+    record_path = _get_hash_record_path(path=path)
+    record = {
+        "path": osp.abspath(path),
+        "hash": hash,
+        "signature": _get_file_signature(path=path),
+    }
+    # The record only saves rehashing, so failing to write it is not an error.
+    try:
+        _dump_json_atomic(path=record_path, obj=record)
+    except OSError:
+        pass
+
+
+def _get_validators_record_path(path: str) -> str:
+    key = hashlib.sha256(osp.abspath(path).encode()).hexdigest()
+    return osp.join(cache_root, "_validators", f"{key}.json")
+
+
+def _record_validators(path: str, validators: dict[str, str]) -> None:
+    record = {
+        "path": osp.abspath(path),
+        "signature": _get_file_signature(path=path),
+        "validators": validators,
+        "checked_at": time.time(),
+    }
+    # Without the record, the file is downloaded again, which is not an error.
+    try:
+        _dump_json_atomic(path=_get_validators_record_path(path=path), obj=record)
+    except OSError:
+        pass
+
+
+def _is_unchanged(
+    path: str,
+    url: str | None,
+    max_age: float | None,
+    quiet: bool,
+    kwargs: _DownloadKwargs,
+) -> bool:
+    """Checks if the file at path is the same as the one on the server."""
+    try:
+        with open(_get_validators_record_path(path=path)) as f:
+            record = json.load(f)
+        signature = _get_file_signature(path=path)
+    except (OSError, ValueError):
+        return False
+    if record.get("path") != osp.abspath(path) or record.get("signature") != signature:
+        # The file was not downloaded by us or was modified since.
+        return False
+    if max_age is not None and time.time() - record["checked_at"] <= max_age:
+        return True
+
+    try:
+        validators = _get_current_validators(url=url, kwargs=kwargs)
+    except (requests.exceptions.RequestException, FileURLRetrievalError) as e:
+        print(f"Failed to revalidate {path}, using it as is: {e}", file=sys.stderr)
+        return True
+    if validators is None:
+        return True
+
+    if not _validators_match(recorded=record["validators"], current=validators):
+        if not quiet:
+            print(f"File changed on the server: {path}", file=sys.stderr)
+        return False
+    _record_validators(path=path, validators=record["validators"])
+    return True
+
+
+def _get_current_validators(
+    url: str | None, kwargs: _DownloadKwargs
+) -> dict[str, str] | None:
+    """Requests the validators of the file on the server, if it has a URL."""
+    if url is None:
+        if kwargs.get("id") is None:
+            return None
+        url = f"https://drive.google.com/uc?id={kwargs['id']}"
+    res = _probe_file(
+        url=url,
+        format=kwargs.get("format"),
+        proxy=kwargs.get("proxy"),
+        use_cookies=kwargs.get("use_cookies", True),
+        verify=kwargs.get("verify", True),
+        user_agent=kwargs.get("user_agent"),
+        session=kwargs.get("session"),
+    )
+    res.raise_for_status()
+    return _get_validators(response=res)
+
+
+def _validators_match(recorded: dict[str, str], current: dict[str, str]) -> bool:
+    keys = recorded.keys() & current.keys()
+    return bool(keys) and all(recorded[key] == current[key] for key in keys)
+
+
+def _get_postprocess_id(postprocess: Callable[[str], object]) -> str | None:
+    """Returns a stable identity of postprocess, or None if it has none.
+
+    Lambdas, closures, bound methods and other callable objects have none, as
+    different ones share the same name.
+    """
+    if isinstance(postprocess, functools.partial):
+        func_id = _get_postprocess_id(postprocess.func)
+        if func_id is None:
+            return None
+        try:
+            args = json.dumps(
+                [list(postprocess.args), postprocess.keywords], sort_keys=True
+            )
+        except (TypeError, ValueError):
+            return None
+        return f"{func_id}{args}"
+    if (
+        not inspect.isfunction(postprocess)
+        or "<" in postprocess.__qualname__
+        or postprocess.__closure__ is not None
+    ):
+        return None
+    return f"{postprocess.__module__}.{postprocess.__qualname__}"
+
+
+def _get_postprocess_record_path(path: str, postprocess_id: str) -> str:
+    key = json.dumps([osp.abspath(path), postprocess_id])
+    return osp.join(
+        cache_root, "_postprocess", hashlib.sha256(key.encode()).hexdigest() + ".json"
+    )
+
+
+def _get_postprocess_record(
+    path: str, postprocess_id: str, hash: str | None
+) -> dict[str, object]:
+    return {
+        "path": osp.abspath(path),
+        "postprocess": postprocess_id,
+        "artifact": hash or _get_file_signature(path=path),
+    }
+
+
+def _is_postprocessed(path: str, postprocess_id: str, hash: str | None) -> bool:
+    """Checks if postprocess completed on the file at path as it is now."""
+    try:
+        with open(
+            _get_postprocess_record_path(path=path, postprocess_id=postprocess_id)
+        ) as f:
+            record = json.load(f)
+        return record == _get_postprocess_record(
+            path=path, postprocess_id=postprocess_id, hash=hash
+        )
+    except (OSError, ValueError):
+        return False
+
+
+def _record_postprocessed(path: str, postprocess_id: str, hash: str | None) -> None:
+    # Written only after postprocess returns, so an interrupted one runs again.
+    try:
+        _dump_json_atomic(
+            path=_get_postprocess_record_path(path=path, postprocess_id=postprocess_id),
+            obj=_get_postprocess_record(
+                path=path, postprocess_id=postprocess_id, hash=hash
+            ),
+        )
+    except OSError:
+        pass
@@ -0,0 +1,130 @@
+import contextlib
+import email.utils
+import threading
+import time
+from collections.abc import Iterator
+
+import requests
+
+from .exceptions import ThrottledError
+
+
+class AdaptiveConcurrency:
+    """Limits concurrent transfers, adapting the limit to throttling.
+
+    The limit starts at max_limit. It is halved, down to min_limit, when a
+    transfer is throttled with 429, 5xx or a Google Drive quota page, and grows
+    back by one per limit transfers that succeed (AIMD). New transfers wait for
+    the Retry-After of a throttled transfer to elapse. Share an instance between
+    downloads to adapt their concurrency together.
+
+    Parameters
+    ----------
+    max_limit:
+        Maximum number of concurrent transfers.
+    min_limit:
+        Minimum number of concurrent transfers. Default is 1.
+
+    Raises
+    ------
+    ValueError
+        If min_limit is not positive or is greater than max_limit.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1) -> None:
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(
+                f"Limits must be 1 <= min_limit <= max_limit: {min_limit}, {max_limit}"
+            )
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self._limit = float(max_limit)
+        self._active = 0
+        self._resume_at = 0.0
+        # Incremented on each decrease, so that the transfers that were in
+        # flight when the limit was decreased don't decrease it again.
+        self._generation = 0
+        self._local = threading.local()
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    def acquire(self) -> None:
+        """Waits for a free slot and for any Retry-After to elapse, then takes it."""
+        with self._condition:
+            while True:
+                delay = self._resume_at - time.monotonic()
+                if delay <= 0 and self._active < int(self._limit):
+                    break
+                self._condition.wait(timeout=delay if delay > 0 else None)
+            self._active += 1
+            self._local.generation = self._generation
+
+    def release(self) -> None:
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def report(self, error: BaseException | None) -> None:
+        """Adapts the limit to the outcome of a transfer of the calling thread.
+
+        error is None if the transfer succeeded. Errors other than throttling
+        leave the limit unchanged.
+        """
+        with self._condition:
+            if error is None:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._condition.notify_all()
+                return
+            if not _is_throttling(error):
+                return
+            retry_after = _get_retry_after(error)
+            if retry_after is not None:
+                self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+            if getattr(self._local, "generation", self._generation) == self._generation:
+                self._limit = max(self.min_limit, self._limit / 2)
+                self._generation += 1
+
+
+def _is_throttling(error: BaseException) -> bool:
+    if isinstance(error, ThrottledError):
+        return True
+    return (
+        isinstance(error, requests.exceptions.HTTPError)
+        and error.response is not None
+        and (error.response.status_code == 429 or error.response.status_code >= 500)
+    )
+
+
+def _get_retry_after(error: BaseException) -> float | None:
+    """Returns the seconds the server asked to wait with error, if any."""
+    if isinstance(error, ThrottledError):
+        return error.retry_after
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return _parse_retry_after(error.response.headers.get("Retry-After"))
+    return None
+
+
+def _parse_retry_after(value: str | None) -> float | None:
+    """Parses Retry-After, given as seconds or as an HTTP date."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
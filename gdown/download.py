@@ -1,46 +1,103 @@
 import collections
+import concurrent.futures
+import contextlib
 import datetime
 import email.utils
+import hashlib
+import http.client
+import json
 import os
 import os.path as osp
+import queue
+import random
 import re
 import shutil
 import sys
-import tempfile
 import textwrap
+import threading
 import time
 import urllib.parse
 import warnings
 from collections.abc import Callable
+from collections.abc import Iterable
+from collections.abc import Iterator
 from http.cookiejar import MozillaCookieJar
+from typing import Any
 from typing import BinaryIO
 
 import bs4
 import requests
+import requests.adapters
 import tqdm
 
+from .concurrency import AdaptiveConcurrency
+from .concurrency import _get_retry_after
+from .concurrency import _parse_retry_after
 from .exceptions import DownloadError
 from .exceptions import FileURLRetrievalError
+from .exceptions import ThrottledError
+from .json_file import _dump_json_atomic
 from .parse_url import parse_url
+from .speed_limit import SpeedLimiter
+from .url_cache import _drop_resolved_url
+from .url_cache import _get_resolved_url
+from .url_cache import _set_resolved_url
 
 CHUNK_SIZE = 512 * 1024  # 512KB
+RETRY_BACKOFF = 1.0  # seconds
+RETRY_BACKOFF_MAX = 60.0  # seconds
 home = osp.expanduser("~")
 
+# We need to use different user agent for file download c.f., folder
+_FILE_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36"  # NOQA: E501
+
+# Downloads sharing a session save its cookies from several threads.
+_cookies_lock = threading.Lock()
+
 GoogleDriveFileToDownload = collections.namedtuple(
     "GoogleDriveFileToDownload", ("id", "path", "local_path")
 )
 
 
+# Each line holding a link, form, URL or error of the confirmation page
+# contains one of these, so only such lines need to be parsed.
+_CONFIRMATION_MARKERS = re.compile(
+    r'href="/uc\?export=download|download-form|"downloadUrl":"'
+    r'|<p class="uc-error-subcaption">'
+)
+# Error of the confirmation page when the download quota of the file is exceeded.
+_QUOTA_EXCEEDED = re.compile(r"Too many users have viewed or downloaded", re.I)
+# Line boundaries of str.splitlines.
+_LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+_LINE_BREAK = re.compile(f"[{_LINE_BREAKS}]")
+
+
+def _iter_confirmation_lines(contents: str) -> Iterator[str]:
+    pos = 0
+    while True:
+        m = _CONFIRMATION_MARKERS.search(contents, pos)
+        if m is None:
+            return
+        start = max(contents.rfind(c, 0, m.start()) for c in _LINE_BREAKS) + 1
+        end_m = _LINE_BREAK.search(contents, m.end())
+        end = len(contents) if end_m is None else end_m.start()
+        yield contents[start:end]
+        pos = end
+
+
 def get_url_from_gdrive_confirmation(contents: str) -> str:
     url = ""
-    for line in contents.splitlines():
+    for line in _iter_confirmation_lines(contents):
         m = re.search(r'href="(\/uc\?export=download[^"]+)', line)
         if m:
             url = "https://docs.google.com" + m.groups()[0]
             url = url.replace("&amp;", "&")
             break
-        soup = bs4.BeautifulSoup(line, features="html.parser")
-        form = soup.select_one("#download-form")
+        if "download-form" in line:
+            soup = bs4.BeautifulSoup(line, features="html.parser")
+            form = soup.select_one("#download-form")
+        else:
+            form = None
         if form is not None:
             action = form["action"]
             assert isinstance(action, str)
@@ -65,6 +122,8 @@ def get_url_from_gdrive_confirmation(contents: str) -> str:
         m = re.search('<p class="uc-error-subcaption">(.*)</p>', line)
         if m:
             error = m.groups()[0]
+            if _QUOTA_EXCEEDED.search(error):
+                raise ThrottledError(error)
             raise FileURLRetrievalError(error)
     if not url:
         raise FileURLRetrievalError(
@@ -111,20 +170,30 @@ def _get_modified_time_from_response(
     return email.utils.parsedate_to_datetime(raw)
 
 
+def _get_cookies_file() -> str:
+    return osp.join(home, ".cache/gdown/cookies.txt")
+
+
 def _get_session(
     proxy: str | None,
     use_cookies: bool,
     user_agent: str,
+    pool_maxsize: int = requests.adapters.DEFAULT_POOLSIZE,
 ) -> tuple[requests.Session, str]:
     sess = requests.session()
 
     sess.headers.update({"User-Agent": user_agent})
 
+    if pool_maxsize > requests.adapters.DEFAULT_POOLSIZE:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        sess.mount("http://", adapter)
+        sess.mount("https://", adapter)
+
     if proxy is not None:
         sess.proxies = {"http": proxy, "https": proxy}
         print("Using proxy:", proxy, file=sys.stderr)
 
-    cookies_file = osp.join(home, ".cache/gdown/cookies.txt")
+    cookies_file = _get_cookies_file()
     if use_cookies and osp.exists(cookies_file):
         cookie_jar = MozillaCookieJar(cookies_file)
         try:
@@ -139,12 +208,664 @@ def _get_session(
     return sess, cookies_file
 
 
+# Errors of a transfer that may succeed if the request is sent again.
+_RETRYABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+    requests.exceptions.HTTPError,
+    ThrottledError,
+)
+
+
+def _get_retry_delay(retry: int, error: BaseException | None = None) -> float:
+    """Returns seconds to wait before the retry-th retry, with full jitter.
+
+    Waits at least as long as the Retry-After that came with error, if any.
+    """
+    delay = random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** (retry - 1)))
+    if error is None:
+        return delay
+    return max(delay, _get_retry_after(error) or 0.0)
+
+
+def _raise_if_stopped(stop: threading.Event | None) -> None:
+    if stop is not None and stop.is_set():
+        raise DownloadError("Download cancelled")
+
+
+def _wait_for_retry(delay: float, stop: threading.Event | None) -> None:
+    """Waits delay seconds before a retry, unless stop is set meanwhile."""
+    if stop is None:
+        time.sleep(delay)
+    elif stop.wait(timeout=delay):
+        raise DownloadError("Download cancelled")
+
+
+def _raise_for_retryable_status(response: requests.Response) -> None:
+    if response.status_code == 429 or response.status_code >= 500:
+        response.close()
+        response.raise_for_status()
+
+
+def _record_attempt(
+    attempts: list[dict[str, Any]] | None,
+    start: int,
+    size: int,
+    started_at: float,
+    error: Exception | None,
+) -> None:
+    if attempts is not None:
+        attempts.append(
+            {
+                "start": start,
+                "bytes": size,
+                "seconds": time.time() - started_at,
+                "error": error,
+            }
+        )
+
+
+def _open_range(
+    sess: requests.Session,
+    url: str,
+    start: int,
+    end: int | None,
+    verify: bool | str,
+) -> requests.Response | None:
+    """Requests bytes from start to end, or to the end of the file if None.
+
+    Returns None if the server doesn't serve the range.
+    """
+    res = sess.get(
+        url,
+        headers={"Range": f"bytes={start}-{'' if end is None else end}"},
+        stream=True,
+        verify=verify,
+    )
+    _raise_for_retryable_status(response=res)
+    content_range = res.headers.get("Content-Range", "")
+    if res.status_code != 206 or not content_range.startswith(
+        f"bytes {start}-{'' if end is None else f'{end}/'}"
+    ):
+        res.close()
+        return None
+    return res
+
+
+def _download_segments(
+    sess: requests.Session,
+    url: str,
+    verify: bool | str,
+    f: BinaryIO,
+    tmp_file: str,
+    total: int,
+    connections: int,
+    on_chunk: Callable[[int], None],
+    chunk_size: int = CHUNK_SIZE,
+    retries: int = 0,
+    attempts: list[dict[str, Any]] | None = None,
+    concurrency: AdaptiveConcurrency | None = None,
+) -> bool:
+    """Download byte ranges of the file concurrently into tmp_file.
+
+    Returns False without writing anything if the server doesn't honour Range.
+    A segment whose transfer fails is resumed from its last byte up to retries
+    times. With concurrency, each transfer takes a slot of it.
+    """
+    segment_size = -(-total // connections)
+    segments = [
+        (start, min(start + segment_size, total) - 1)
+        for start in range(0, total, segment_size)
+    ]
+
+    # Probe with the first segment so that a server ignoring Range costs
+    # a single request instead of one full-body response per connection.
+    try:
+        first = _open_range(sess, url, *segments[0], verify=verify)
+    except requests.exceptions.HTTPError:
+        first = None
+    if first is None:
+        return False
+
+    f.truncate(total)
+    f.flush()
+
+    written = [0] * len(segments)
+    stop = threading.Event()
+
+    def fetch(index: int) -> None:
+        start, end = segments[index]
+        if stop.is_set():
+            if index == 0:
+                first.close()
+            return
+        retry = 0
+        while True:
+            position = start + written[index]
+            started_at = time.time()
+            try:
+                with (
+                    contextlib.nullcontext()
+                    if concurrency is None
+                    else concurrency.slot()
+                ):
+                    if index == 0 and retry == 0:
+                        res = first
+                    else:
+                        res = _open_range(sess, url, position, end, verify)
+                    if res is None:
+                        raise DownloadError(
+                            f"Server stopped honouring Range requests: {url}"
+                        )
+                    try:
+                        with open(tmp_file, "r+b") as segment_f:
+                            segment_f.seek(position)
+                            for chunk in _iter_body(res=res, chunk_size=chunk_size):
+                                if stop.is_set():
+                                    return
+                                segment_f.write(chunk)
+                                written[index] += len(chunk)
+                                on_chunk(len(chunk))
+                    finally:
+                        res.close()
+            except _RETRYABLE_ERRORS as e:
+                if concurrency is not None:
+                    concurrency.report(e)
+                _record_attempt(
+                    attempts=attempts,
+                    start=position,
+                    size=start + written[index] - position,
+                    started_at=started_at,
+                    error=e,
+                )
+                if retry >= retries or stop.is_set():
+                    raise
+                retry += 1
+                time.sleep(_get_retry_delay(retry=retry, error=e))
+                continue
+            if concurrency is not None:
+                concurrency.report(None)
+            _record_attempt(
+                attempts=attempts,
+                start=position,
+                size=start + written[index] - position,
+                started_at=started_at,
+                error=None,
+            )
+            break
+        if written[index] != end - start + 1:
+            raise DownloadError(
+                f"Incomplete segment bytes={start}-{end}: "
+                f"got {written[index]} bytes from {url}"
+            )
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=len(segments)
+        ) as executor:
+            futures = [executor.submit(fetch, i) for i in range(len(segments))]
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    except BaseException:
+        # Keep only the contiguous prefix so that resume appends correctly.
+        prefix = 0
+        for (start, end), size in zip(segments, written):
+            prefix += size
+            if size != end - start + 1:
+                break
+        f.truncate(prefix)
+        raise
+    return True
+
+
+def _iter_body(
+    res: requests.Response,
+    chunk_size: int,
+    get_buffer: Callable[[], bytearray] | None = None,
+) -> Iterator[bytes | memoryview]:
+    """Yields the body of res in chunks of up to chunk_size bytes.
+
+    A body without Content-Encoding is read from the connection straight into
+    buffers from get_buffer (by default, one buffer reused for every chunk),
+    instead of into a new bytes object per chunk as with iter_content, so each
+    chunk is only valid until its buffer is reused. Other bodies are decoded
+    by iter_content.
+    """
+    fp = getattr(res.raw, "_fp", None)
+    if not isinstance(fp, http.client.HTTPResponse) or res.headers.get(
+        "Content-Encoding", "identity"
+    ) not in ("", "identity"):
+        yield from res.iter_content(chunk_size=chunk_size)
+        return
+
+    if get_buffer is None:
+        buffer = bytearray(chunk_size)
+
+        def get_buffer() -> bytearray:
+            return buffer
+
+    while True:
+        view = memoryview(get_buffer())[:chunk_size]
+        try:
+            size = fp.readinto(view)
+        except http.client.IncompleteRead as e:
+            raise requests.exceptions.ChunkedEncodingError(e) from e
+        except OSError as e:
+            raise requests.exceptions.ConnectionError(e) from e
+        if not size:
+            break
+        yield view[:size]
+    if fp.length:
+        # http.client ends a body cut short by the server without an error.
+        raise requests.exceptions.ChunkedEncodingError(
+            f"Connection closed with {fp.length} bytes of the body left"
+        )
+    # The body was read past urllib3, which hence doesn't reuse the connection
+    # on its own.
+    res.raw.release_conn()
+
+
+def _write_pipelined(
+    chunks: Iterable[bytes | memoryview],
+    write: Callable[[bytes | memoryview], None],
+    depth: int,
+    on_read: Callable[[int], None] | None = None,
+    buffers: queue.Queue[bytearray] | None = None,
+) -> None:
+    """Writes chunks with write in a writer thread while the next are read.
+
+    Up to depth chunks wait to be written, after which reading waits for the
+    writer. on_read is called with the size of each chunk on the reading thread.
+    The chunks read before an error of reading are written before it is raised.
+    The buffer of each chunk that is a memoryview is put back into buffers once
+    the chunk is written.
+    """
+    # Chunks with the buffer they were received into, if from buffers.
+    pending: queue.Queue[tuple[bytes | memoryview, bytearray | None] | None] = (
+        queue.Queue(maxsize=depth)
+    )
+    errors: list[BaseException] = []
+
+    def writer() -> None:
+        while True:
+            item = pending.get()
+            if item is None:
+                return
+            chunk, buffer = item
+            try:
+                if not errors:
+                    write(chunk)
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                # Also after an error, so that reading doesn't wait forever.
+                if buffer is not None:
+                    assert buffers is not None
+                    buffers.put(buffer)
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    try:
+        for chunk in chunks:
+            if errors:
+                break
+            if on_read is not None:
+                on_read(len(chunk))
+            buffer = None
+            if (
+                buffers is not None
+                and isinstance(chunk, memoryview)
+                and isinstance(chunk.obj, bytearray)
+            ):
+                buffer = chunk.obj
+            pending.put((chunk, buffer))
+    finally:
+        pending.put(None)
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _get_output_path(output: str | None, filename: str) -> str:
+    """Returns the path to download to, appending filename to a directory."""
+    if output is None:
+        return filename
+    if output.endswith(("/", "\\")) or osp.isdir(output):
+        if not osp.exists(output):
+            os.makedirs(output)
+        output = osp.join(output, filename)
+    return output
+
+
+def _get_part_path(output: str, source: list[str | None]) -> str:
+    """Returns the path to download source to before moving it to output."""
+    key = hashlib.sha256(json.dumps(source).encode()).hexdigest()[:16]
+    return f"{output}.{key}.part"
+
+
+def _is_part_resumable(part_path: str, validators: dict[str, str]) -> bool:
+    """Checks if the part is of the version of the file with validators."""
+    try:
+        with open(f"{part_path}.json") as f:
+            part_validators = json.load(f)["validators"]
+        size = os.path.getsize(part_path)
+    except (OSError, ValueError, KeyError):
+        return False
+    if any(
+        part_validators[key] != validators[key]
+        for key in part_validators.keys() & validators.keys()
+    ):
+        return False
+    return "Content-Length" not in validators or size <= int(
+        validators["Content-Length"]
+    )
+
+
+def _get_hashers(algorithms: Iterable[str]) -> dict[str, Any]:
+    hashers = {}
+    for algorithm in algorithms:
+        if algorithm not in hashlib.algorithms_guaranteed:
+            raise ValueError(
+                f"Unsupported hash algorithm: {algorithm}. "
+                f"Supported algorithms: {hashlib.algorithms_guaranteed}"
+            )
+        hashers[algorithm] = hashlib.new(algorithm)
+    return hashers
+
+
+def _update_hashers_from_file(
+    hashers: dict[str, Any], path: str, size: int | None = None
+) -> None:
+    """Updates hashers with the first size bytes of the file, or all of it."""
+    with open(path, "rb") as f:
+        while size is None or size > 0:
+            block = f.read(CHUNK_SIZE if size is None else min(CHUNK_SIZE, size))
+            if not block:
+                break
+            for hasher in hashers.values():
+                hasher.update(block)
+            if size is not None:
+                size -= len(block)
+
+
+def _is_file_response(response: requests.Response) -> bool:
+    return "Content-Disposition" in response.headers and not response.headers.get(
+        "Content-Type", ""
+    ).startswith("text/html")
+
+
+def _get_file_response(
+    sess: requests.Session,
+    url: str,
+    gdrive_file_id: str | None,
+    is_gdrive_download_link: bool,
+    format: str | None,
+    verify: bool | str,
+    use_cookies: bool,
+    cookies_file: str,
+    headers: dict[str, str] | None = None,
+) -> tuple[requests.Response, str]:
+    """Follows Google Drive's interstitial pages up to the response of the file.
+
+    Returns the response and the URL it was requested with. headers are sent
+    with each request, except to get a page whose range they asked for.
+    """
+    url_origin = url
+    while True:
+        res = sess.get(url, headers=headers, stream=True, verify=verify)
+        if res.status_code == 206 and res.headers.get("Content-Type", "").startswith(
+            "text/html"
+        ):
+            # This is a page to follow, so it is needed whole.
+            res.close()
+            res = sess.get(url, stream=True, verify=verify)
+
+        if res.status_code in (429, 503):
+            res.close()
+            raise ThrottledError(
+                f"Too many requests (status code {res.status_code}): {url}",
+                retry_after=_parse_retry_after(res.headers.get("Retry-After")),
+            )
+
+        if not (gdrive_file_id and is_gdrive_download_link):
+            break
+
+        if url == url_origin and res.status_code == 500:
+            # The file could be Google Docs or Spreadsheets.
+            url = f"https://drive.google.com/open?id={gdrive_file_id}"
+            continue
+
+        if res.headers["Content-Type"].startswith("text/html"):
+            if "/document/" in res.url and "/export" not in res.url:
+                url = (
+                    "https://docs.google.com/document/d/{id}/export"
+                    "?format={format}".format(
+                        id=gdrive_file_id,
+                        format="docx" if format is None else format,
+                    )
+                )
+                continue
+            elif "/spreadsheets/" in res.url and "/export" not in res.url:
+                url = (
+                    "https://docs.google.com/spreadsheets/d/{id}/export"
+                    "?format={format}".format(
+                        id=gdrive_file_id,
+                        format="xlsx" if format is None else format,
+                    )
+                )
+                continue
+            elif "/presentation/" in res.url and "/export" not in res.url:
+                url = (
+                    "https://docs.google.com/presentation/d/{id}/export"
+                    "?format={format}".format(
+                        id=gdrive_file_id,
+                        format="pptx" if format is None else format,
+                    )
+                )
+                continue
+        elif (
+            "Content-Disposition" in res.headers
+            and res.headers["Content-Disposition"].endswith("pptx")
+            and format not in {None, "pptx"}
+        ):
+            url = (
+                "https://docs.google.com/presentation/d/{id}/export"
+                "?format={format}".format(
+                    id=gdrive_file_id,
+                    format="pptx" if format is None else format,
+                )
+            )
+            continue
+
+        if use_cookies:
+            with _cookies_lock:
+                cookie_jar = MozillaCookieJar(cookies_file)
+                for cookie in sess.cookies:
+                    cookie_jar.set_cookie(cookie)
+                cookie_jar.save()
+
+        if "Content-Disposition" in res.headers:
+            # This is the file
+            break
+
+        # Need to redirect with confirmation
+        try:
+            url = get_url_from_gdrive_confirmation(res.text)
+        except FileURLRetrievalError as e:
+            message = (
+                "Failed to retrieve file url:\n\n{}\n\n"
+                "You may still be able to access the file from the browser:"
+                "\n\n\t{}\n\n"
+                "but Gdown can't. Please check connections and permissions."
+            ).format(
+                textwrap.indent("\n".join(textwrap.wrap(str(e))), prefix="\t"),
+                url_origin,
+            )
+            if isinstance(e, ThrottledError):
+                raise ThrottledError(message, retry_after=e.retry_after)
+            raise FileURLRetrievalError(message)
+
+    return res, url
+
+
+def _resolve_file_response(
+    sess: requests.Session,
+    url: str,
+    format: str | None,
+    verify: bool | str,
+    use_cookies: bool,
+    cookies_file: str,
+    url_cache_ttl: float | None,
+    headers: dict[str, str] | None = None,
+) -> tuple[requests.Response, str, str, str | None]:
+    """Requests the file at url, resolving Google Drive URLs to the file.
+
+    Returns the response, the URL it was requested with, the original URL, and
+    the Google Drive file ID if any.
+    """
+    url_origin = url
+    gdrive_file_id, is_gdrive_download_link = parse_url(url=url)
+
+    if gdrive_file_id:
+        url = f"https://drive.google.com/uc?id={gdrive_file_id}"
+        url_origin = url
+        is_gdrive_download_link = True
+
+    res = None
+    use_url_cache = (
+        url_cache_ttl is not None and gdrive_file_id and is_gdrive_download_link
+    )
+    if use_url_cache:
+        assert gdrive_file_id is not None and url_cache_ttl is not None
+        resolved = _get_resolved_url(
+            file_id=gdrive_file_id, format=format, ttl=url_cache_ttl
+        )
+        if resolved is not None:
+            res = sess.get(resolved.url, headers=headers, stream=True, verify=verify)
+            if res.status_code in (200, 206) and _is_file_response(response=res):
+                url = resolved.url
+            else:
+                # The resolved URL expired and serves an HTML page instead.
+                res.close()
+                res = None
+                _drop_resolved_url(file_id=gdrive_file_id, format=format)
+    if res is None:
+        res, url = _get_file_response(
+            sess=sess,
+            url=url,
+            gdrive_file_id=gdrive_file_id,
+            is_gdrive_download_link=is_gdrive_download_link,
+            format=format,
+            verify=verify,
+            use_cookies=use_cookies,
+            cookies_file=cookies_file,
+            headers=headers,
+        )
+        if (
+            use_url_cache
+            and res.status_code in (200, 206)
+            and _is_file_response(response=res)
+        ):
+            assert gdrive_file_id is not None
+            _set_resolved_url(
+                file_id=gdrive_file_id,
+                format=format,
+                url=res.url,
+                filename=_get_filename_from_response(response=res),
+                last_modified=res.headers.get("Last-Modified"),
+                size=_get_size_from_response(response=res),
+                accept_ranges=_accepts_ranges(response=res),
+            )
+
+    return res, url, url_origin, gdrive_file_id if is_gdrive_download_link else None
+
+
+def _get_size_from_response(response: requests.Response) -> int | None:
+    """Returns the size of the file, also from the response of a range of it."""
+    if response.status_code == 206:
+        m = re.fullmatch(
+            r"bytes [0-9]+-[0-9]+/([0-9]+)", response.headers.get("Content-Range", "")
+        )
+        return int(m.group(1)) if m else None
+    if response.status_code != 200 or "Content-Encoding" in response.headers:
+        return None
+    if "Content-Length" not in response.headers:
+        return None
+    return int(response.headers["Content-Length"])
+
+
+def _accepts_ranges(response: requests.Response) -> bool:
+    return (
+        response.status_code == 206 or response.headers.get("Accept-Ranges") == "bytes"
+    )
+
+
+def _get_validators(response: requests.Response) -> dict[str, str]:
+    """Returns the headers of a file response that change with its content."""
+    validators = {
+        key: response.headers[key]
+        for key in ("ETag", "Last-Modified")
+        if key in response.headers
+    }
+    size = _get_size_from_response(response=response)
+    if size is not None:
+        validators["Content-Length"] = str(size)
+    return validators
+
+
+def _probe_file(
+    url: str,
+    format: str | None = None,
+    proxy: str | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    user_agent: str | None = None,
+    session: requests.Session | None = None,
+    url_cache_ttl: float | None = None,
+) -> requests.Response:
+    """Requests the first byte of the file at url, without reading the body.
+
+    The returned response is closed, and only good for its status and headers.
+    Servers that don't support range requests answer with the whole file, whose
+    body is left unread.
+    """
+    if session is None:
+        sess, cookies_file = _get_session(
+            proxy=proxy,
+            use_cookies=use_cookies,
+            user_agent=_FILE_USER_AGENT if user_agent is None else user_agent,
+        )
+    else:
+        sess, cookies_file = session, _get_cookies_file()
+    try:
+        res, _, _, _ = _resolve_file_response(
+            sess=sess,
+            url=url,
+            format=format,
+            verify=verify,
+            use_cookies=use_cookies,
+            cookies_file=cookies_file,
+            url_cache_ttl=url_cache_ttl,
+            headers={"Range": "bytes=0-0"},
+        )
+        res.close()
+    finally:
+        if session is None:
+            sess.close()
+    return res
+
+
 def download(
     url: str | None = None,
     output: str | BinaryIO | None = None,
     quiet: bool = False,
     proxy: str | None = None,
-    speed: float | None = None,
+    speed: float | SpeedLimiter | None = None,
     use_cookies: bool = True,
     verify: bool | str = True,
     id: str | None = None,
@@ -154,6 +875,16 @@ def download(
     log_messages: dict[str, str] | None = None,
     progress: Callable[[int, int | None], None] | None = None,
     skip_download: bool = False,
+    connections: int = 1,
+    session: requests.Session | None = None,
+    url_cache_ttl: float | None = None,
+    digests: dict[str, str] | None = None,
+    validators: dict[str, str] | None = None,
+    retries: int = 0,
+    attempts: list[dict[str, Any]] | None = None,
+    concurrency: AdaptiveConcurrency | None = None,
+    pipeline_depth: int = 0,
+    stop: threading.Event | None = None,
 ) -> str | BinaryIO | GoogleDriveFileToDownload:
     """Download file from URL.
 
@@ -170,7 +901,8 @@ def download(
     proxy:
         Proxy.
     speed:
-        Download byte size per second (e.g., 256KB/s = 256 * 1024).
+        Download byte size per second (e.g., 256KB/s = 256 * 1024), shared by
+        all connections, or a SpeedLimiter to share with other downloads.
     use_cookies:
         Flag to use cookies. Default is True.
     verify:
@@ -200,6 +932,56 @@ def download(
     skip_download:
         Resolve the Google Drive filename without downloading the file body.
         Default is False.
+    connections:
+        Number of parallel connections to download the file with, each
+        fetching a byte range of it. Falls back to a single connection when
+        the server doesn't support range requests, when resuming, or when
+        writing to a file object. Default is 1.
+    session:
+        Session to send the requests with, e.g., to reuse its connection pool
+        across downloads. It is left open, and proxy, use_cookies and
+        user_agent only apply to requests made without it. Size its pool to
+        at least connections. Default is a new session per download.
+    url_cache_ttl:
+        Seconds to reuse the download URL resolved for a Google Drive file
+        from ~/.cache/gdown/urls, skipping the confirmation pages. A cached
+        URL that no longer serves the file is dropped and resolved again.
+        Default is None, which doesn't use the cache.
+    digests:
+        Dictionary whose keys are hash algorithms (e.g., 'sha256') to compute
+        while the file is written. On return, each value is set to the hash of
+        the file in the format of {algorithm}:{hash_value}. A resumed download
+        hashes the partial file once before appending to it.
+    validators:
+        Dictionary updated with the headers of the file response that change
+        with its content (ETag, Last-Modified and Content-Length), e.g., to
+        check later if the file changed without downloading it again.
+    retries:
+        Number of times to retry the transfer of the file body after the
+        connection drops, times out or the server fails with 429 or 5xx,
+        waiting with jittered exponential backoff in between. A retry requests
+        the rest of the file from the already resolved URL and appends to what
+        was written. Default is 0.
+    attempts:
+        List appended with a dictionary per attempt to transfer the file body
+        (or a segment of it), with 'start' (the byte offset it started at),
+        'bytes' (the bytes it wrote), 'seconds' (its duration) and 'error'
+        (the exception that ended it, or None).
+    concurrency:
+        AdaptiveConcurrency that the transfers of the file (one per connection)
+        take slots of, to share it with other downloads. Resolving the file is
+        also retried when throttled. Default is a new one of connections slots
+        when connections is greater than 1.
+    pipeline_depth:
+        Number of chunks that may wait to be written to output by a separate
+        thread while the next ones are received, so that slow writes and
+        progress callbacks don't stall the connection. The progress callback is
+        then called in that thread. Only applies to a single connection.
+        Default is 0, which writes each chunk before receiving the next.
+    stop:
+        Event that aborts the download with DownloadError when set, e.g., from
+        another thread. It is checked before each attempt and after each chunk,
+        and ends the wait before a retry. Default is None.
 
     Returns
     -------
@@ -211,235 +993,316 @@ def download(
     Raises
     ------
     ValueError
-        If neither url nor id is specified, or both are specified.
+        If neither url nor id is specified, or both are specified, or
+        connections is not positive, or retries or pipeline_depth is negative, or
+        digests has an unsupported algorithm.
     FileURLRetrievalError
         If the file URL cannot be retrieved from Google Drive, or if
         skip_download is True and no Google Drive filename can be resolved.
     DownloadError
-        If the download fails (e.g., multiple temporary files exist during
-        resume).
+        If the download fails.
     """
     if not (id is None) ^ (url is None):
         raise ValueError("Either url or id has to be specified")
+    if connections < 1:
+        raise ValueError(f"connections must be positive: {connections}")
+    if retries < 0:
+        raise ValueError(f"retries must not be negative: {retries}")
+    if pipeline_depth < 0:
+        raise ValueError(f"pipeline_depth must not be negative: {pipeline_depth}")
+    hashers = _get_hashers(algorithms=digests or ())
     if id is not None:
         url = f"https://drive.google.com/uc?id={id}"
     assert url is not None
     if user_agent is None:
-        # We need to use different user agent for file download c.f., folder
-        user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36"  # NOQA: E501
+        user_agent = _FILE_USER_AGENT
     if log_messages is None:
         log_messages = {}
+    if speed is not None and not isinstance(speed, SpeedLimiter):
+        speed = SpeedLimiter(speed=speed)
+    # Read no more than the limiter lets through at a time, to avoid bursts.
+    chunk_size = CHUNK_SIZE if speed is None else min(CHUNK_SIZE, speed.burst)
 
-    url_origin = url
-
-    sess, cookies_file = _get_session(
-        proxy=proxy,
-        use_cookies=use_cookies,
-        user_agent=user_agent,
-    )
-
-    gdrive_file_id, is_gdrive_download_link = parse_url(url=url)
-
-    if gdrive_file_id:
-        url = f"https://drive.google.com/uc?id={gdrive_file_id}"
-        url_origin = url
-        is_gdrive_download_link = True
-
-    while True:
-        res = sess.get(url, stream=True, verify=verify)
-
-        if not (gdrive_file_id and is_gdrive_download_link):
-            break
-
-        if url == url_origin and res.status_code == 500:
-            # The file could be Google Docs or Spreadsheets.
-            url = f"https://drive.google.com/open?id={gdrive_file_id}"
-            continue
+    if session is None:
+        sess, cookies_file = _get_session(
+            proxy=proxy,
+            use_cookies=use_cookies,
+            user_agent=user_agent,
+            pool_maxsize=connections,
+        )
+    else:
+        sess, cookies_file = session, _get_cookies_file()
 
-        if res.headers["Content-Type"].startswith("text/html"):
-            if "/document/" in res.url and "/export" not in res.url:
-                url = (
-                    "https://docs.google.com/document/d/{id}/export"
-                    "?format={format}".format(
-                        id=gdrive_file_id,
-                        format="docx" if format is None else format,
-                    )
-                )
-                continue
-            elif "/spreadsheets/" in res.url and "/export" not in res.url:
-                url = (
-                    "https://docs.google.com/spreadsheets/d/{id}/export"
-                    "?format={format}".format(
-                        id=gdrive_file_id,
-                        format="xlsx" if format is None else format,
-                    )
-                )
-                continue
-            elif "/presentation/" in res.url and "/export" not in res.url:
-                url = (
-                    "https://docs.google.com/presentation/d/{id}/export"
-                    "?format={format}".format(
-                        id=gdrive_file_id,
-                        format="pptx" if format is None else format,
-                    )
-                )
-                continue
-        elif (
-            "Content-Disposition" in res.headers
-            and res.headers["Content-Disposition"].endswith("pptx")
-            and format not in {None, "pptx"}
-        ):
-            url = (
-                "https://docs.google.com/presentation/d/{id}/export"
-                "?format={format}".format(
-                    id=gdrive_file_id,
-                    format="pptx" if format is None else format,
+    if concurrency is None and connections > 1:
+        concurrency = AdaptiveConcurrency(max_limit=connections)
+    # A slot is held from resolving the file to the end of its transfer.
+    if concurrency is not None:
+        concurrency.acquire()
+    holds_slot = concurrency is not None
+    tmp_file = None
+    f = None
+    try:
+        retry = 0
+        while True:
+            _raise_if_stopped(stop=stop)
+            try:
+                res, url, url_origin, gdrive_file_id = _resolve_file_response(
+                    sess=sess,
+                    url=url,
+                    format=format,
+                    verify=verify,
+                    use_cookies=use_cookies,
+                    cookies_file=cookies_file,
+                    url_cache_ttl=url_cache_ttl,
+                    # Only the headers are needed, so don't let the body be sent.
+                    headers={"Range": "bytes=0-0"} if skip_download else None,
                 )
-            )
-            continue
-
-        if use_cookies:
-            cookie_jar = MozillaCookieJar(cookies_file)
-            for cookie in sess.cookies:
-                cookie_jar.set_cookie(cookie)
-            cookie_jar.save()
+                break
+            except _RETRYABLE_ERRORS as e:
+                if concurrency is not None:
+                    concurrency.report(e)
+                if retry >= retries:
+                    raise
+                retry += 1
+                _wait_for_retry(delay=_get_retry_delay(retry=retry, error=e), stop=stop)
+        if validators is not None:
+            validators.update(_get_validators(response=res))
 
-        if "Content-Disposition" in res.headers:
-            # This is the file
-            break
+        filename_from_url = None
+        last_modified_time = None
+        if gdrive_file_id:
+            filename_from_url = _get_filename_from_response(response=res)
+            last_modified_time = _get_modified_time_from_response(response=res)
 
-        # Need to redirect with confirmation
-        try:
-            url = get_url_from_gdrive_confirmation(res.text)
-        except FileURLRetrievalError as e:
-            message = (
-                "Failed to retrieve file url:\n\n{}\n\n"
-                "You may still be able to access the file from the browser:"
-                "\n\n\t{}\n\n"
-                "but Gdown can't. Please check connections and permissions."
-            ).format(
-                textwrap.indent("\n".join(textwrap.wrap(str(e))), prefix="\t"),
-                url_origin,
+        if skip_download:
+            res.close()
+            if filename_from_url is None:
+                raise FileURLRetrievalError(
+                    "Could not determine the Google Drive filename; --json requires "
+                    f"a resolvable Google Drive file (got: {url_origin})"
+                )
+            return GoogleDriveFileToDownload(
+                id=gdrive_file_id, path=filename_from_url, local_path=filename_from_url
             )
-            raise FileURLRetrievalError(message)
-
-    filename_from_url = None
-    last_modified_time = None
-    if gdrive_file_id and is_gdrive_download_link:
-        filename_from_url = _get_filename_from_response(response=res)
-        last_modified_time = _get_modified_time_from_response(response=res)
 
-    if skip_download:
         if filename_from_url is None:
-            raise FileURLRetrievalError(
-                "Could not determine the Google Drive filename; --json requires "
-                f"a resolvable Google Drive file (got: {url_origin})"
-            )
-        return GoogleDriveFileToDownload(
-            id=gdrive_file_id, path=filename_from_url, local_path=filename_from_url
-        )
+            filename_from_url = _sanitize_filename(filename=osp.basename(url))
 
-    if filename_from_url is None:
-        filename_from_url = _sanitize_filename(filename=osp.basename(url))
+        if output is None or isinstance(output, str):
+            output = _get_output_path(output=output, filename=filename_from_url)
 
-    if output is None:
-        output = filename_from_url
+        if isinstance(output, str):
+            if resume and os.path.isfile(output):
+                if not quiet:
+                    print(f"Skipping already downloaded file {output}", file=sys.stderr)
+                if digests is not None:
+                    _update_hashers_from_file(hashers=hashers, path=output)
+                    for algorithm, hasher in hashers.items():
+                        digests[algorithm] = f"{algorithm}:{hasher.hexdigest()}"
+                return output
 
-    if isinstance(output, str) and (output.endswith(("/", "\\")) or osp.isdir(output)):
-        if not osp.exists(output):
-            os.makedirs(output)
-        output = osp.join(output, filename_from_url)
-
-    if isinstance(output, str):
-        if resume and os.path.isfile(output):
-            if not quiet:
-                print(f"Skipping already downloaded file {output}", file=sys.stderr)
-            return output
-
-        existing_tmp_files = []
-        for file in os.listdir(osp.dirname(output) or "."):
-            if file.startswith(osp.basename(output)) and file.endswith(".part"):
-                existing_tmp_files.append(osp.join(osp.dirname(output), file))
-        if resume and existing_tmp_files:
-            if len(existing_tmp_files) != 1:
-                lines = ["There are multiple temporary files to resume:", ""]
-                for file in existing_tmp_files:
-                    lines.append(f"\t{file}")
-                lines.append("")
-                lines.append("Please remove them except one to resume downloading.")
-                raise DownloadError("\n".join(lines))
-            tmp_file = existing_tmp_files[0]
+            tmp_file = _get_part_path(output=output, source=[url_origin, format])
+            part_validators = _get_validators(response=res)
+            if resume and not _is_part_resumable(
+                part_path=tmp_file, validators=part_validators
+            ):
+                resume = False
+            if not resume:
+                # Record the version of the file the part is of, to resume it later.
+                _dump_json_atomic(
+                    path=f"{tmp_file}.json", obj={"validators": part_validators}
+                )
+            f = open(tmp_file, "ab" if resume else "wb")
         else:
-            resume = False
-            # Avoid mkstemp which doesn't work on Windows (#153)
-            tmp_file_obj = tempfile.NamedTemporaryFile(
-                suffix=".part",
-                prefix=osp.basename(output),
-                dir=osp.dirname(output),
-                delete=False,
-            )
-            tmp_file = tmp_file_obj.name
-            tmp_file_obj.close()
-        f = open(tmp_file, "ab")
-    else:
-        tmp_file = None
-        f = output
+            tmp_file = None
+            f = output
 
-    if tmp_file is not None and f.tell() != 0:
-        start_size = f.tell()
-        headers = {"Range": f"bytes={start_size}-"}
-        res = sess.get(url, headers=headers, stream=True, verify=verify)
-    else:
         start_size = 0
+        if tmp_file is not None and f.tell() != 0:
+            res.close()
+            headers = {"Range": f"bytes={f.tell()}-"}
+            res = sess.get(url, headers=headers, stream=True, verify=verify)
+            if res.status_code == 206:
+                start_size = f.tell()
+                if hashers:
+                    _update_hashers_from_file(
+                        hashers=hashers, path=tmp_file, size=start_size
+                    )
+            else:
+                # The range is not served, so download the whole file again.
+                f.seek(0)
+                f.truncate()
 
-    if not quiet:
-        print(log_messages.get("start", "Downloading...\n"), file=sys.stderr, end="")
-        if resume:
-            print("Resume:", tmp_file, file=sys.stderr)
-        if url_origin != url:
-            print("From (original):", url_origin, file=sys.stderr)
-            print("From (redirected):", url, file=sys.stderr)
-        else:
-            print("From:", url, file=sys.stderr)
-        print(
-            log_messages.get(
-                "output",
-                f"To: {osp.abspath(output) if isinstance(output, str) else output}\n",
-            ),
-            file=sys.stderr,
-            end="",
-        )
+        if not quiet:
+            print(
+                log_messages.get("start", "Downloading...\n"), file=sys.stderr, end=""
+            )
+            if resume:
+                print("Resume:", tmp_file, file=sys.stderr)
+            if url_origin != url:
+                print("From (original):", url_origin, file=sys.stderr)
+                print("From (redirected):", url, file=sys.stderr)
+            else:
+                print("From:", url, file=sys.stderr)
+            to = osp.abspath(output) if isinstance(output, str) else output
+            print(log_messages.get("output", f"To: {to}\n"), file=sys.stderr, end="")
 
-    try:
         total = res.headers.get("Content-Length")
         if total is not None:
             total = int(total) + start_size
         if not quiet:
             pbar = tqdm.tqdm(total=total, unit="B", initial=start_size, unit_scale=True)
-        t_start = time.time()
         downloaded = 0
-        for chunk in res.iter_content(chunk_size=CHUNK_SIZE):
-            f.write(chunk)
-            downloaded += len(chunk)
-            if not quiet:
-                pbar.update(len(chunk))
-            if progress is not None:
-                progress(downloaded + start_size, total)
+        lock = threading.Lock()
+
+        def on_written(size: int) -> None:
+            nonlocal downloaded
+            with lock:
+                downloaded += size
+                if not quiet:
+                    pbar.update(size)
+                if progress is not None:
+                    progress(downloaded + start_size, total)
+            _raise_if_stopped(stop=stop)
+
+        def on_chunk(size: int) -> None:
+            on_written(size)
             if speed is not None:
-                elapsed_time_expected = downloaded / speed
-                elapsed_time = time.time() - t_start
-                if elapsed_time < elapsed_time_expected:
-                    time.sleep(elapsed_time_expected - elapsed_time)
+                speed.consume(size)
+
+        def write_chunk(chunk: bytes | memoryview) -> None:
+            f.write(chunk)
+            for hasher in hashers.values():
+                hasher.update(chunk)
+            on_written(len(chunk))
+
+        segmented = False
+        if (
+            connections > 1
+            and tmp_file is not None
+            and start_size == 0
+            and total is not None
+            and "Content-Encoding" not in res.headers
+        ):
+            n_segments = min(connections, -(-total // CHUNK_SIZE))
+            if n_segments > 1:
+                res.close()
+                if holds_slot:
+                    # Each segment takes a slot of its own.
+                    assert concurrency is not None
+                    concurrency.release()
+                    holds_slot = False
+                segmented = _download_segments(
+                    sess=sess,
+                    url=url,
+                    verify=verify,
+                    f=f,
+                    tmp_file=tmp_file,
+                    total=total,
+                    connections=n_segments,
+                    on_chunk=on_chunk,
+                    chunk_size=chunk_size,
+                    retries=retries,
+                    attempts=attempts,
+                    concurrency=concurrency,
+                )
+                if segmented and hashers:
+                    # Segments arrive out of order, so hash the assembled file.
+                    _update_hashers_from_file(hashers=hashers, path=tmp_file)
+                if not segmented:
+                    if concurrency is not None:
+                        concurrency.acquire()
+                        holds_slot = True
+                    res = sess.get(url, stream=True, verify=verify)
+        retry = 0
+        while not segmented:
+            _raise_if_stopped(stop=stop)
+            position = start_size + downloaded
+            started_at = time.time()
+            try:
+                if retry > 0:
+                    rest = _open_range(sess, url, position, None, verify)
+                    if rest is None:
+                        if tmp_file is None:
+                            raise DownloadError(
+                                f"Server doesn't serve the rest of the file: {url}"
+                            )
+                        # The range is not served, so download the whole file again.
+                        rest = sess.get(url, stream=True, verify=verify)
+                        _raise_for_retryable_status(response=rest)
+                        f.seek(0)
+                        f.truncate()
+                        hashers = _get_hashers(algorithms=digests or ())
+                        position = start_size = downloaded = 0
+                        if not quiet:
+                            pbar.reset(total=total)
+                    res = rest
+                if pipeline_depth > 0:
+                    # Buffers being received into, waiting and being written.
+                    buffers: queue.Queue[bytearray] = queue.Queue()
+                    for _ in range(pipeline_depth + 2):
+                        buffers.put(bytearray(chunk_size))
+                    _write_pipelined(
+                        chunks=_iter_body(
+                            res=res, chunk_size=chunk_size, get_buffer=buffers.get
+                        ),
+                        write=write_chunk,
+                        depth=pipeline_depth,
+                        on_read=None if speed is None else speed.consume,
+                        buffers=buffers,
+                    )
+                else:
+                    for chunk in _iter_body(res=res, chunk_size=chunk_size):
+                        write_chunk(chunk)
+                        if speed is not None:
+                            speed.consume(len(chunk))
+            except _RETRYABLE_ERRORS as e:
+                res.close()
+                if concurrency is not None:
+                    concurrency.report(e)
+                _record_attempt(
+                    attempts=attempts,
+                    start=position,
+                    size=start_size + downloaded - position,
+                    started_at=started_at,
+                    error=e,
+                )
+                if retry >= retries:
+                    raise
+                retry += 1
+                _wait_for_retry(delay=_get_retry_delay(retry=retry, error=e), stop=stop)
+                continue
+            if concurrency is not None:
+                concurrency.report(None)
+            _record_attempt(
+                attempts=attempts,
+                start=position,
+                size=start_size + downloaded - position,
+                started_at=started_at,
+                error=None,
+            )
+            break
+        if digests is not None:
+            for algorithm, hasher in hashers.items():
+                digests[algorithm] = f"{algorithm}:{hasher.hexdigest()}"
         if not quiet:
             pbar.close()
         if tmp_file:
             f.close()
             assert isinstance(output, str)
             shutil.move(tmp_file, output)
+            os.remove(f"{tmp_file}.json")
         if isinstance(output, str) and last_modified_time:
             mtime = last_modified_time.timestamp()
             os.utime(output, (mtime, mtime))
     finally:
-        sess.close()
+        if tmp_file is not None and f is not None:
+            # Keep what was written to resume from it.
+            f.close()
+        if holds_slot:
+            assert concurrency is not None
+            concurrency.release()
+        if session is None:
+            sess.close()
 
     return output
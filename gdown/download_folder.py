@@ -1,19 +1,32 @@
 from __future__ import annotations
 
+import concurrent.futures
+import itertools
+import json
 import os
 import os.path as osp
 import re
 import sys
+import threading
 import urllib.parse
+from collections.abc import Iterable
+from collections.abc import Iterator
+from typing import Any
 
 import bs4
 import requests
+import tqdm
 
+from .concurrency import AdaptiveConcurrency
+from .download import _FILE_USER_AGENT
 from .download import GoogleDriveFileToDownload
 from .download import _get_session
 from .download import _sanitize_filename
 from .download import download
 from .exceptions import DownloadError
+from .json_file import _dump_json_atomic
+from .speed_limit import SpeedLimiter
+from .stat import stat
 
 
 class _GoogleDriveFile:
@@ -35,21 +48,188 @@ class _GoogleDriveFile:
         return self.type == self.TYPE_FOLDER
 
 
-def _get_directory_structure(
-    gdrive_file: _GoogleDriveFile, previous_path: str
-) -> list[tuple[str | None, str]]:
-    """Converts a Google Drive folder structure into a local directory list."""
+class _FolderManifest:
+    """Records the size and modified time of the files synced into a folder.
 
-    directory_structure = []
-    for file in gdrive_file.children:
-        file.name = _sanitize_filename(filename=file.name)
-        if file.is_folder():
-            directory_structure.append((None, osp.join(previous_path, file.name)))
-            for i in _get_directory_structure(file, osp.join(previous_path, file.name)):
-                directory_structure.append(i)
-        elif not file.children:
-            directory_structure.append((file.id, osp.join(previous_path, file.name)))
-    return directory_structure
+    Paths are relative to the folder, and the entries are keyed by file ID.
+    """
+
+    FILENAME = ".gdown-manifest.json"
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir = root_dir
+        self.path = osp.join(root_dir, self.FILENAME)
+        try:
+            with open(self.path) as f:
+                self.previous: dict[str, dict[str, Any]] = json.load(f)["files"]
+        except (OSError, ValueError, KeyError):
+            self.previous = {}
+        self.current: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get_unchanged(
+        self,
+        file: GoogleDriveFileToDownload,
+        size: int | None,
+        modified_time: str | None,
+    ) -> str | None:
+        """Returns the local path of file if it was synced and is unchanged."""
+        entry = self.previous.get(file.id)
+        if (
+            entry is None
+            or (size is None and modified_time is None)
+            or [entry["path"], entry["size"], entry["modified_time"]]
+            != [file.path, size, modified_time]
+        ):
+            return None
+        local_path = osp.join(self.root_dir, entry["local_path"])
+        if not osp.isfile(local_path) or (
+            size is not None and osp.getsize(local_path) != size
+        ):
+            return None
+        self.set(file=file, local_path=local_path, entry=entry)
+        return local_path
+
+    def set(
+        self, file: GoogleDriveFileToDownload, local_path: str, entry: dict[str, Any]
+    ) -> None:
+        entry = dict(entry, local_path=osp.relpath(local_path, self.root_dir))
+        with self._lock:
+            self.current[file.id] = entry
+
+    def save(self) -> None:
+        with self._lock:
+            # Keep files that weren't synced this time for the next time.
+            files = dict(self.previous, **self.current)
+        _dump_json_atomic(path=self.path, obj={"files": files})
+
+    def prune(self, quiet: bool) -> list[str]:
+        """Removes files synced before that are no longer in the folder.
+
+        This includes the previous local copies of files that were renamed or
+        moved in the folder.
+        """
+        local_paths = {entry["local_path"] for entry in self.current.values()}
+        removed = []
+        for id, entry in list(self.previous.items()):
+            if (
+                id in self.current
+                and self.current[id]["local_path"] == entry["local_path"]
+            ):
+                continue
+            del self.previous[id]
+            if entry["local_path"] in local_paths:
+                continue
+            local_path = osp.join(self.root_dir, entry["local_path"])
+            try:
+                os.remove(local_path)
+            except FileNotFoundError:
+                continue
+            if not quiet:
+                print(f"Removed {local_path}", file=sys.stderr)
+            removed.append(local_path)
+            # Remove the folders the file leaves empty.
+            dirname = osp.dirname(entry["local_path"])
+            while dirname:
+                try:
+                    os.rmdir(osp.join(self.root_dir, dirname))
+                except OSError:
+                    break
+                dirname = osp.dirname(dirname)
+        return removed
+
+
+class _FolderJournal:
+    """Appends the listing of a folder and the files downloaded from it.
+
+    Each record is a line of JSON: an entry of the listing, a record that the
+    listing is complete, or a record that a file was downloaded. A truncated
+    last line, e.g., from a crash while writing it, is ignored.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.entries: list[tuple[tuple[int, ...], GoogleDriveFileToDownload]] = []
+        self.listed = False
+        self.done: dict[str, str] = {}
+        self._size = 0
+        self._file: Any = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            with open(self.path, "rb") as f:
+                lines = f.read().split(b"\n")
+        except FileNotFoundError:
+            return
+        # The last item is what follows the last newline, i.e., not a record.
+        for line in lines[:-1]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break
+            self._size += len(line) + 1
+            if "listed" in record:
+                self.listed = True
+            elif "done" in record:
+                self.done[record["done"]] = record["local_path"]
+            else:
+                self.entries.append(
+                    (
+                        tuple(record["position"]),
+                        GoogleDriveFileToDownload(
+                            id=record["id"],
+                            path=record["path"],
+                            local_path=record["local_path"],
+                        ),
+                    )
+                )
+
+    def start(self) -> None:
+        """Starts a new journal, keeping the files downloaded before."""
+        os.makedirs(osp.dirname(osp.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, "w")
+        for path, local_path in self.done.items():
+            self._write({"done": path, "local_path": local_path})
+
+    def resume(self) -> None:
+        """Appends to the loaded journal after its last complete record."""
+        os.truncate(self.path, self._size)
+        self._file = open(self.path, "a")
+
+    def record_entries(
+        self, entries: Iterable[tuple[tuple[int, ...], GoogleDriveFileToDownload]]
+    ) -> Iterator[tuple[tuple[int, ...], GoogleDriveFileToDownload]]:
+        for position, entry in entries:
+            self._write({"position": position, **entry._asdict()})
+            yield position, entry
+        self._write({"listed": True})
+        os.fsync(self._file.fileno())
+
+    def record_done(self, file: GoogleDriveFileToDownload, local_path: str) -> None:
+        self._write({"done": file.path, "local_path": local_path})
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+    def remove(self) -> None:
+        self.close()
+        os.remove(self.path)
+
+    def _write(self, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+
+
+def _get_journal_path(output: str | None, folder_id: str) -> str:
+    if output is None:
+        output = os.getcwd() + osp.sep
+    if output.endswith(osp.sep):
+        # The folder is named after the listing, so name the journal after its ID.
+        return osp.join(output, f".gdown-journal-{folder_id}.jsonl")
+    return osp.join(output, ".gdown-journal.jsonl")
 
 
 def download_folder(
@@ -58,12 +238,16 @@ def download_folder(
     output: str | None = None,
     quiet: bool = False,
     proxy: str | None = None,
-    speed: float | None = None,
+    speed: float | SpeedLimiter | None = None,
     use_cookies: bool = True,
     verify: bool | str = True,
     user_agent: str | None = None,
     skip_download: bool = False,
     resume: bool = False,
+    max_workers: int = 1,
+    sync: bool = False,
+    prune: bool = False,
+    retries: int = 0,
 ) -> list[str] | list[GoogleDriveFileToDownload]:
     """Downloads entire folder from URL.
 
@@ -82,7 +266,8 @@ def download_folder(
     proxy:
         Proxy.
     speed:
-        Download byte size per second (e.g., 256KB/s = 256 * 1024).
+        Download byte size per second (e.g., 256KB/s = 256 * 1024), shared by
+        all files, or a SpeedLimiter to share with other downloads.
     use_cookies:
         Flag to use cookies. Default is True.
     verify:
@@ -98,21 +283,43 @@ def download_folder(
         Resume interrupted transfers.
         Completed output files will be skipped.
         Partial tempfiles will be reused, if the transfer is incomplete.
+        If an interrupted download left a journal in the output folder
+        (.gdown-journal.jsonl), the folder is not listed again and the files
+        it records as downloaded are skipped.
         Default is False.
+    max_workers:
+        Number of folders to list and files to download in parallel.
+        The files downloaded in parallel are fewer while Google Drive
+        throttles them, with 429, 5xx or quota pages. Default is 1.
+    sync:
+        Download only the files that are new or changed since the last sync,
+        comparing their size and modified time with a manifest kept in the
+        output folder (.gdown-manifest.json). Default is False.
+    prune:
+        With sync, remove the local files synced before that are no longer in
+        the folder, or that were renamed or moved in it. Default is False.
+    retries:
+        Number of times to retry each file when its download is throttled or
+        its connection drops, resuming the transfer from where it stopped.
+        Default is 0.
 
     Returns
     -------
     files:
-        If skip_download is False, list of local file paths downloaded.
+        If skip_download is False, list of local file paths downloaded, or
+        with sync, of all files in the folder.
         If skip_download is True, list of GoogleDriveFileToDownload that contains
         id, path, and local_path.
 
     Raises
     ------
     ValueError
-        If neither url nor id is specified, or both are specified.
+        If neither url nor id is specified, or both are specified, or
+        max_workers is not positive, or sync is combined with skip_download,
+        or prune is used without sync.
     DownloadError
-        If a file in the folder fails to download.
+        If any file in the folder fails to download. The other files are
+        still downloaded, and the error lists every failed file.
 
     Example
     -------
@@ -121,8 +328,202 @@ def download_folder(
         "1ZXEhzbLRLU1giKKRJkjm8N04cO_JoYE2",
     )
     """
+    if sync and skip_download:
+        raise ValueError("sync cannot be combined with skip_download")
+    if prune and not sync:
+        raise ValueError("prune requires sync")
+    sess, folder_id = _get_folder_session(
+        url=url,
+        id=id,
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=user_agent,
+        max_workers=max_workers,
+    )
+
+    journal = None
+    if not skip_download:
+        journal = _FolderJournal(
+            path=_get_journal_path(output=output, folder_id=folder_id)
+        )
+        if resume:
+            journal.load()
+
+    entries: Iterator[tuple[tuple[int, ...], GoogleDriveFileToDownload]]
+    if journal is not None and journal.listed:
+        if not quiet:
+            print(f"Resuming from {journal.path}", file=sys.stderr)
+        journal.resume()
+        entries = iter(journal.entries)
+    else:
+        if not quiet:
+            print("Retrieving folder contents", file=sys.stderr)
+        entries = _iter_folder(
+            sess=sess,
+            folder_id=folder_id,
+            output=output,
+            quiet=quiet,
+            verify=verify,
+            max_workers=max_workers,
+        )
+        if journal is not None:
+            journal.start()
+            entries = journal.record_entries(entries)
+    manifest = None
+    if sync:
+        root = next(entries)
+        entries = itertools.chain([root], entries)
+        manifest = _FolderManifest(root_dir=root[1].local_path)
+
+    # Files are downloaded while the rest of the tree is still being listed,
+    # so keep their positions to return them in listing order.
+    positions: list[tuple[int, ...]] = []
+
+    def iter_files() -> Iterator[GoogleDriveFileToDownload]:
+        for position, entry in entries:
+            if entry.id is None:  # folder
+                if not skip_download and not osp.exists(entry.local_path):
+                    os.makedirs(entry.local_path, exist_ok=True)
+                continue
+            positions.append(position)
+            yield entry
+        if not quiet and not (journal is not None and journal.listed):
+            print("Retrieving folder contents completed", file=sys.stderr)
+
+    if skip_download:
+        listing = list(iter_files())
+        order = sorted(range(len(listing)), key=lambda i: positions[i])
+        return [listing[i] for i in order]
+
+    if speed is not None and not isinstance(speed, SpeedLimiter):
+        speed = SpeedLimiter(speed=speed)
+    # One keep-alive pool for all files saves a TLS handshake and a cookie
+    # file parse per file.
+    file_sess, _ = _get_session(
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=_FILE_USER_AGENT,
+        pool_maxsize=max_workers,
+    )
+    try:
+        local_paths = _download_files(
+            files=iter_files(),
+            max_workers=max_workers,
+            quiet=quiet,
+            speed=speed,
+            use_cookies=use_cookies,
+            verify=verify,
+            resume=resume,
+            session=file_sess,
+            retries=retries,
+            manifest=manifest,
+            journal=journal,
+        )
+    finally:
+        file_sess.close()
+        assert journal is not None
+        journal.close()
+        if manifest is not None:
+            manifest.save()
+    # The next download lists the folder again to pick up its changes.
+    journal.remove()
+    if prune:
+        assert manifest is not None
+        manifest.prune(quiet=quiet)
+        manifest.save()
+    if not quiet:
+        print("Download completed", file=sys.stderr)
+    order = sorted(range(len(local_paths)), key=lambda i: positions[i])
+    return [local_paths[i] for i in order]
+
+
+def iter_folder(
+    url: str | None = None,
+    id: str | None = None,
+    output: str | None = None,
+    quiet: bool = False,
+    proxy: str | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    user_agent: str | None = None,
+    max_workers: int = 1,
+) -> Iterator[GoogleDriveFileToDownload]:
+    """Lists files in a folder from URL while the folder is being retrieved.
+
+    Unlike download_folder with skip_download, each file is yielded as soon
+    as the folder that contains it is retrieved, so the files can be consumed
+    before the whole folder tree is listed.
+
+    Parameters
+    ----------
+    url:
+        URL of the Google Drive folder.
+        Must be of the format 'https://drive.google.com/drive/folders/{url}'.
+    id:
+        Google Drive's folder ID.
+    output:
+        String containing the path of the output folder.
+        Defaults to current working directory.
+    quiet:
+        Suppress terminal output.
+    proxy:
+        Proxy.
+    use_cookies:
+        Flag to use cookies. Default is True.
+    verify:
+        Either a bool, in which case it controls whether the server's TLS
+        certificate is verified, or a string, in which case it must be a path
+        to a CA bundle to use. Default is True.
+    user_agent:
+        User-agent to use in the HTTP request.
+    max_workers:
+        Number of folders to retrieve in parallel. Default is 1.
+
+    Returns
+    -------
+    files:
+        Iterator of GoogleDriveFileToDownload that contains id, path, and
+        local_path, in the order the files are retrieved.
+
+    Raises
+    ------
+    ValueError
+        If neither url nor id is specified, or both are specified, or
+        max_workers is not positive.
+    DownloadError
+        If a folder fails to be retrieved, when the iterator is consumed.
+    """
+    sess, folder_id = _get_folder_session(
+        url=url,
+        id=id,
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=user_agent,
+        max_workers=max_workers,
+    )
+    entries = _iter_folder(
+        sess=sess,
+        folder_id=folder_id,
+        output=output,
+        quiet=quiet,
+        verify=verify,
+        max_workers=max_workers,
+    )
+    return (entry for _, entry in entries if entry.id is not None)
+
+
+def _get_folder_session(
+    url: str | None,
+    id: str | None,
+    proxy: str | None,
+    use_cookies: bool,
+    user_agent: str | None,
+    max_workers: int,
+) -> tuple[requests.Session, str]:
     if not (id is None) ^ (url is None):
         raise ValueError("Either url or id has to be specified")
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be positive: {max_workers}")
     if id is not None:
         folder_id = id
     else:
@@ -132,70 +533,294 @@ def download_folder(
         # We need to use different user agent for folder download c.f., file
         user_agent = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/98.0.4758.102 Safari/537.36"  # NOQA: E501
 
-    sess, _ = _get_session(proxy=proxy, use_cookies=use_cookies, user_agent=user_agent)
+    sess, _ = _get_session(
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=user_agent,
+        pool_maxsize=max_workers,
+    )
+    return sess, folder_id
+
 
-    if not quiet:
-        print("Retrieving folder contents", file=sys.stderr)
-    gdrive_file = _download_and_parse_google_drive_link(
+def _iter_folder(
+    sess: requests.Session,
+    folder_id: str,
+    output: str | None,
+    quiet: bool,
+    verify: bool | str,
+    max_workers: int,
+) -> Iterator[tuple[tuple[int, ...], GoogleDriveFileToDownload]]:
+    """Yields the root folder, then its folders and files as they are listed.
+
+    Each entry comes with a position that sorts the entries into depth-first
+    listing order. Folder entries have no id.
+    """
+    folders = _iter_google_drive_folders(
         sess=sess,
         folder_id=folder_id,
         quiet=quiet,
         verify=verify,
+        max_workers=max_workers,
     )
-
-    gdrive_file.name = _sanitize_filename(filename=gdrive_file.name)
-
-    if not quiet:
-        print("Retrieving folder contents completed", file=sys.stderr)
-        print("Building directory structure", file=sys.stderr)
-    directory_structure = _get_directory_structure(gdrive_file, previous_path="")
-    if not quiet:
-        print("Building directory structure completed", file=sys.stderr)
+    gdrive_file = next(folders)
 
     if output is None:
         output = os.getcwd() + osp.sep
     if output.endswith(osp.sep):
-        root_dir = osp.join(output, gdrive_file.name)
+        root_dir = osp.join(output, _sanitize_filename(filename=gdrive_file.name))
     else:
         root_dir = output
-    if not skip_download and not osp.exists(root_dir):
-        os.makedirs(root_dir)
+    yield (), GoogleDriveFileToDownload(id=None, path="", local_path=root_dir)
+
+    for position, id, path in _iter_directory_structure(gdrive_file, folders):
+        yield (
+            position,
+            GoogleDriveFileToDownload(
+                id=id, path=path, local_path=osp.join(root_dir, path)
+            ),
+        )
 
-    files = []
-    for id, path in directory_structure:
-        local_path = osp.join(root_dir, path)
 
-        if id is None:  # folder
-            if not skip_download and not osp.exists(local_path):
-                os.makedirs(local_path)
-            continue
+def _iter_directory_structure(
+    gdrive_file: _GoogleDriveFile,
+    folders: Iterator[_GoogleDriveFile],
+) -> Iterator[tuple[tuple[int, ...], str | None, str]]:
+    """Converts a Google Drive folder structure into a local directory list.
 
-        if skip_download:
-            files.append(
-                GoogleDriveFileToDownload(id=id, path=path, local_path=local_path)
-            )
+    Entries are yielded as soon as the folders that contain them arrive from
+    folders, each as (position, id, path) where id is None for folders.
+    """
+    retrieved = {gdrive_file.id}
+    # Places where a folder appears but whose contents haven't arrived yet.
+    pending: dict[str, list[tuple[tuple[int, ...], str, frozenset[str]]]] = {}
+
+    def place(
+        folder: _GoogleDriveFile,
+        position: tuple[int, ...],
+        path: str,
+        ancestor_ids: frozenset[str],
+    ) -> Iterator[tuple[tuple[int, ...], str | None, str]]:
+        ancestor_ids = ancestor_ids | {folder.id}
+        for index, file in enumerate(folder.children):
+            file_position = position + (index,)
+            if file.is_folder():
+                if file.id in ancestor_ids:
+                    # Shortcut back to an enclosing folder.
+                    continue
+                if file.id not in retrieved:
+                    pending.setdefault(file.id, []).append(
+                        (file_position, path, ancestor_ids)
+                    )
+                    continue
+                file_path = osp.join(path, _sanitize_filename(filename=file.name))
+                yield file_position, None, file_path
+                yield from place(file, file_position, file_path, ancestor_ids)
+            elif not file.children:
+                file_path = osp.join(path, _sanitize_filename(filename=file.name))
+                yield file_position, file.id, file_path
+
+    yield from place(gdrive_file, (), "", frozenset())
+    for folder in folders:
+        retrieved.add(folder.id)
+        for position, parent_path, ancestor_ids in pending.pop(folder.id, []):
+            path = osp.join(parent_path, _sanitize_filename(filename=folder.name))
+            yield position, None, path
+            yield from place(folder, position, path, ancestor_ids)
+
+
+def _get_download_output(file: GoogleDriveFileToDownload) -> str:
+    # Google-native files (Docs, Sheets, Slides) have no extension
+    # in the folder listing. Pass the directory so download() resolves
+    # the correct filename from the Content-Disposition header.
+    if osp.splitext(file.local_path)[1]:
+        return file.local_path
+    return osp.dirname(file.local_path) + osp.sep
+
+
+def _download_file(
+    file: GoogleDriveFileToDownload,
+    quiet: bool,
+    speed: SpeedLimiter | None,
+    use_cookies: bool,
+    verify: bool | str,
+    resume: bool,
+    session: requests.Session,
+    retries: int,
+    concurrency: AdaptiveConcurrency,
+    stop: threading.Event | None = None,
+) -> str:
+    local_path = download(
+        url="https://drive.google.com/uc?id=" + file.id,
+        output=_get_download_output(file=file),
+        quiet=quiet,
+        speed=speed,
+        use_cookies=use_cookies,
+        verify=verify,
+        resume=resume,
+        session=session,
+        retries=retries,
+        concurrency=concurrency,
+        stop=stop,
+    )
+    assert isinstance(local_path, str)
+    return local_path
+
+
+def _sync_file(
+    file: GoogleDriveFileToDownload,
+    manifest: _FolderManifest,
+    quiet: bool,
+    speed: SpeedLimiter | None,
+    use_cookies: bool,
+    verify: bool | str,
+    session: requests.Session,
+    retries: int,
+    concurrency: AdaptiveConcurrency,
+    stop: threading.Event | None = None,
+) -> str:
+    file_stat = stat(
+        id=file.id, use_cookies=use_cookies, verify=verify, session=session
+    )
+    entry = {
+        "path": file.path,
+        "size": file_stat.size,
+        "modified_time": None
+        if file_stat.modified_time is None
+        else file_stat.modified_time.isoformat(),
+    }
+    local_path = manifest.get_unchanged(
+        file=file, size=entry["size"], modified_time=entry["modified_time"]
+    )
+    if local_path is not None:
+        if not quiet:
+            print(f"Skipping unchanged file {local_path}", file=sys.stderr)
+        return local_path
+
+    local_path = _download_file(
+        file=file,
+        quiet=quiet,
+        speed=speed,
+        use_cookies=use_cookies,
+        verify=verify,
+        resume=False,
+        session=session,
+        retries=retries,
+        concurrency=concurrency,
+        stop=stop,
+    )
+    manifest.set(file=file, local_path=local_path, entry=entry)
+    return local_path
+
+
+def _download_files(
+    files: Iterable[GoogleDriveFileToDownload],
+    max_workers: int,
+    quiet: bool,
+    speed: SpeedLimiter | None,
+    use_cookies: bool,
+    verify: bool | str,
+    resume: bool,
+    session: requests.Session,
+    retries: int = 0,
+    manifest: _FolderManifest | None = None,
+    journal: _FolderJournal | None = None,
+) -> list[str]:
+    """Downloads files with a pool of workers as they arrive from files.
+
+    With manifest, files that are unchanged since the last sync are skipped.
+    With journal, files it records as downloaded are skipped, and the others
+    are recorded as they are downloaded.
+    Returns local paths in the order of files.
+    """
+    # Drive throttles parallel downloads, so adapt how many run at once.
+    concurrency = AdaptiveConcurrency(max_limit=max_workers)
+    stop = threading.Event()
+
+    pbar = None
+    if not quiet and max_workers > 1:
+        # Per-file progress bars would interleave, so show the file count.
+        pbar = tqdm.tqdm(total=0, unit="file")
+
+    def download_file(file: GoogleDriveFileToDownload) -> str:
+        if journal is not None and manifest is None and file.path in journal.done:
+            # The manifest decides what to skip when syncing.
+            local_path = journal.done[file.path]
         else:
-            # Google-native files (Docs, Sheets, Slides) have no extension
-            # in the folder listing. Pass the directory so download() resolves
-            # the correct filename from the Content-Disposition header.
-            if osp.splitext(local_path)[1]:
-                download_output = local_path
+            if manifest is None:
+                local_path = _download_file(
+                    file=file,
+                    quiet=quiet or max_workers > 1,
+                    speed=speed,
+                    use_cookies=use_cookies,
+                    verify=verify,
+                    resume=resume,
+                    session=session,
+                    retries=retries,
+                    concurrency=concurrency,
+                    stop=stop,
+                )
             else:
-                download_output = osp.dirname(local_path) + osp.sep
-            local_path = download(
-                url="https://drive.google.com/uc?id=" + id,
-                output=download_output,
-                quiet=quiet,
-                proxy=proxy,
-                speed=speed,
-                use_cookies=use_cookies,
-                verify=verify,
-                resume=resume,
-            )
-            files.append(local_path)
-    if not quiet:
-        print("Download completed", file=sys.stderr)
-    return files
+                local_path = _sync_file(
+                    file=file,
+                    manifest=manifest,
+                    quiet=quiet or max_workers > 1,
+                    speed=speed,
+                    use_cookies=use_cookies,
+                    verify=verify,
+                    session=session,
+                    retries=retries,
+                    concurrency=concurrency,
+                    stop=stop,
+                )
+            if journal is not None:
+                journal.record_done(file=file, local_path=local_path)
+        if pbar is not None:
+            pbar.update(1)
+        return local_path
+
+    submitted: list[GoogleDriveFileToDownload] = []
+    futures: list[concurrent.futures.Future] = []
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for file in files:
+            submitted.append(file)
+            futures.append(executor.submit(download_file, file))
+            if pbar is not None:
+                pbar.total = len(futures)
+                pbar.refresh()
+        concurrent.futures.wait(futures)
+    except BaseException:
+        # Stop the running downloads at their next chunk, attempt or retry and
+        # wait for them, so that none writes files or uses the session and
+        # journal after return.
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
+    if pbar is not None:
+        pbar.close()
+
+    local_paths: list[str] = []
+    errors: list[tuple[GoogleDriveFileToDownload, BaseException]] = []
+    for file, future in zip(submitted, futures):
+        error = future.exception()
+        if error is None:
+            local_paths.append(future.result())
+        else:
+            errors.append((file, error))
+    _raise_for_errors(errors=errors, n_files=len(futures))
+    return local_paths
+
+
+def _raise_for_errors(
+    errors: list[tuple[GoogleDriveFileToDownload, BaseException]], n_files: int
+) -> None:
+    """Raises a DownloadError that lists the files that failed, if any."""
+    if errors:
+        lines = [f"Failed to download {len(errors)} of {n_files} files:", ""]
+        for file, error in errors:
+            lines.append(f"\t{file.path}: {error}")
+        raise DownloadError("\n".join(lines)) from errors[0][1]
 
 
 def _extract_folder_id(url: str) -> str:
@@ -268,50 +893,79 @@ def _parse_embedded_folder_view(
     return (folder_name, children)
 
 
-def _download_and_parse_google_drive_link(
+def _iter_google_drive_folders(
     sess: requests.Session,
     folder_id: str,
     quiet: bool = False,
     verify: bool | str = True,
-) -> _GoogleDriveFile:
-    folder_name, children = _parse_embedded_folder_view(
-        sess=sess, folder_id=folder_id, verify=verify
-    )
+    max_workers: int = 1,
+) -> Iterator[_GoogleDriveFile]:
+    """Lists a folder tree breadth-first, fetching sibling folders concurrently.
 
+    Each folder is yielded as soon as its contents are retrieved, starting with
+    the root. A folder referenced more than once (e.g., through shortcuts) is
+    fetched and yielded only once, and shares its node wherever it appears.
+    """
     gdrive_file = _GoogleDriveFile(
         id=folder_id,
-        name=folder_name,
+        name="",
         type=_GoogleDriveFile.TYPE_FOLDER,
     )
+    folders = {folder_id: gdrive_file}
 
-    for child_id, child_name, child_type in children:
-        if child_type != _GoogleDriveFile.TYPE_FOLDER:
-            if not quiet:
-                print(
-                    "Processing file",
-                    child_id,
-                    child_name,
-                )
-            gdrive_file.children.append(
-                _GoogleDriveFile(
-                    id=child_id,
-                    name=child_name,
-                    type=child_type,
-                )
-            )
-            continue
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
 
-        if not quiet:
-            print(
-                "Retrieving folder",
-                child_id,
-                child_name,
-            )
-        child = _download_and_parse_google_drive_link(
-            sess=sess,
-            folder_id=child_id,
-            quiet=quiet,
-            verify=verify,
+    def submit(folder: _GoogleDriveFile) -> concurrent.futures.Future:
+        return executor.submit(
+            _parse_embedded_folder_view, sess=sess, folder_id=folder.id, verify=verify
         )
-        gdrive_file.children.append(child)
-    return gdrive_file
+
+    try:
+        pending = {submit(gdrive_file): gdrive_file}
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                folder = pending.pop(future)
+                folder.name, children = future.result()
+                for child_id, child_name, child_type in children:
+                    if child_type != _GoogleDriveFile.TYPE_FOLDER:
+                        if not quiet:
+                            print(
+                                "Processing file",
+                                child_id,
+                                child_name,
+                            )
+                        folder.children.append(
+                            _GoogleDriveFile(
+                                id=child_id,
+                                name=child_name,
+                                type=child_type,
+                            )
+                        )
+                        continue
+
+                    if child_id in folders:
+                        folder.children.append(folders[child_id])
+                        continue
+
+                    if not quiet:
+                        print(
+                            "Retrieving folder",
+                            child_id,
+                            child_name,
+                        )
+                    child = _GoogleDriveFile(
+                        id=child_id,
+                        name=child_name,
+                        type=child_type,
+                    )
+                    folders[child_id] = child
+                    folder.children.append(child)
+                    pending[submit(child)] = child
+                yield folder
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        raise
+    executor.shutdown()
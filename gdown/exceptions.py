@@ -4,3 +4,9 @@ class DownloadError(Exception):
 
 class FileURLRetrievalError(DownloadError):
     pass
+
+
+class ThrottledError(FileURLRetrievalError):
+    def __init__(self, message: str, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,18 @@
+import json
+import os
+import os.path as osp
+import tempfile
+
+
+def _dump_json_atomic(path: str, obj: object) -> None:
+    """Writes obj as JSON so that readers see either the old or the new file."""
+    dirname = osp.dirname(osp.abspath(path))
+    os.makedirs(dirname, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(obj, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
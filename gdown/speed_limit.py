@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+import time
+
+import filelock
+
+
+class SpeedLimiter:
+    """Limits the total speed of the transfers sharing it, with a token bucket.
+
+    Each transfer takes tokens for the bytes it receives, at most burst bytes at
+    a time, and the bucket refills at speed bytes per second. A transfer that
+    takes more tokens than are left waits for the bucket to refill them, so the
+    bytes received by all transfers together never exceed speed per second plus
+    burst.
+
+    Parameters
+    ----------
+    speed:
+        Bytes per second (e.g., 256KB/s = 256 * 1024).
+    burst:
+        Bytes to receive at a time, which is also the size of the bucket.
+        Default is a tenth of a second of speed, within 1KB and 512KB.
+    path:
+        File to keep the bucket in, to share the limit with other processes
+        that use the same file. It is locked with a .lock file next to it.
+        Default is None, which shares the limit only within the process.
+
+    Raises
+    ------
+    ValueError
+        If speed or burst is not positive.
+    """
+
+    def __init__(
+        self, speed: float, burst: int | None = None, path: str | None = None
+    ) -> None:
+        if speed <= 0:
+            raise ValueError(f"speed must be positive: {speed}")
+        if burst is None:
+            burst = max(1024, min(512 * 1024, int(speed / 10)))
+        if burst < 1:
+            raise ValueError(f"burst must be positive: {burst}")
+        self.speed = speed
+        self.burst = burst
+        self.path = path
+        self._tokens = float(burst)
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+        self._file_lock = None if path is None else filelock.FileLock(f"{path}.lock")
+
+    def consume(self, size: int) -> None:
+        """Waits until size bytes may be received."""
+        while size > 0:
+            n = min(size, self.burst)
+            delay = self._take(n)
+            if delay > 0:
+                time.sleep(delay)
+            size -= n
+
+    async def aconsume(self, size: int) -> None:
+        """Waits until size bytes may be received, without blocking the loop."""
+        while size > 0:
+            n = min(size, self.burst)
+            delay = self._take(n)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            size -= n
+
+    def _take(self, n: int) -> float:
+        """Takes n tokens, and returns seconds to wait for them to be refilled.
+
+        Tokens are taken even if there are fewer, so that transfers wait in the
+        order they took them instead of racing for refilled tokens.
+        """
+        with self._lock:
+            if self._file_lock is None:
+                return self._take_locked(n)
+            with self._file_lock:
+                self._load()
+                delay = self._take_locked(n)
+                self._save()
+                return delay
+
+    def _take_locked(self, n: int) -> float:
+        now = time.time()
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._updated_at) * self.speed
+        )
+        self._updated_at = now
+        self._tokens -= n
+        return -self._tokens / self.speed
+
+    def _load(self) -> None:
+        assert self.path is not None
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+            self._tokens = float(state["tokens"])
+            self._updated_at = float(state["updated_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # No other process has used the bucket yet.
+            pass
+
+    def _save(self) -> None:
+        assert self.path is not None
+        with open(self.path, "w") as f:
+            json.dump({"tokens": self._tokens, "updated_at": self._updated_at}, f)
@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import email.utils
+import threading
+import time
+from collections.abc import Iterable
+
+import requests
+
+from .download import _FILE_USER_AGENT
+from .download import _accepts_ranges
+from .download import _get_filename_from_response
+from .download import _get_modified_time_from_response
+from .download import _get_session
+from .download import _get_size_from_response
+from .download import _probe_file
+from .exceptions import FileURLRetrievalError
+from .parse_url import parse_url
+from .url_cache import _get_resolved_url
+
+FileStat = collections.namedtuple(
+    "FileStat", ("id", "name", "size", "modified_time", "accept_ranges")
+)
+
+# (file ID, format) -> (time of the probe, FileStat)
+_stat_cache: dict[tuple[str, str | None], tuple[float, FileStat]] = {}
+_stat_cache_lock = threading.Lock()
+
+
+def stat(
+    url: str | None = None,
+    id: str | None = None,
+    format: str | None = None,
+    proxy: str | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    user_agent: str | None = None,
+    session: requests.Session | None = None,
+    cache_ttl: float | None = None,
+) -> FileStat:
+    """Get metadata of a file without downloading it.
+
+    Only the first byte of the file is requested, and the response is closed
+    without reading its body.
+
+    Parameters
+    ----------
+    url:
+        URL. Google Drive URL is also supported.
+    id:
+        Google Drive's file ID.
+    format:
+        Format of Google Docs, Spreadsheets and Slides. See `download`.
+    proxy:
+        Proxy.
+    use_cookies:
+        Flag to use cookies. Default is True.
+    verify:
+        Either a bool, in which case it controls whether the server's TLS
+        certificate is verified, or a string, in which case it must be a path
+        to a CA bundle to use. Default is True.
+    user_agent:
+        User-agent to use in the HTTP request.
+    session:
+        Session to send the requests with. It is left open.
+    cache_ttl:
+        Seconds to reuse the metadata of a Google Drive file probed before, in
+        this process or, with the download URL, in ~/.cache/gdown/urls.
+        Default is None, which always probes the file, and keeps no metadata
+        in this process.
+
+    Returns
+    -------
+    file_stat:
+        FileStat with the Google Drive file ID (or None), the filename from
+        the server (or None), the size in bytes (or None), the last modified
+        time as datetime (or None), and whether range requests are supported.
+
+    Raises
+    ------
+    ValueError
+        If neither url nor id is specified, or both are specified.
+    FileURLRetrievalError
+        If the file cannot be retrieved.
+    """
+    if not (id is None) ^ (url is None):
+        raise ValueError("Either url or id has to be specified")
+    if id is not None:
+        url = f"https://drive.google.com/uc?id={id}"
+    assert url is not None
+
+    file_id = parse_url(url=url)[0]
+    if cache_ttl is not None and file_id is not None:
+        file_stat = _get_cached_stat(file_id=file_id, format=format, ttl=cache_ttl)
+        if file_stat is not None:
+            return file_stat
+
+    res = _probe_file(
+        url=url,
+        format=format,
+        proxy=proxy,
+        use_cookies=use_cookies,
+        verify=verify,
+        user_agent=user_agent,
+        session=session,
+        url_cache_ttl=cache_ttl,
+    )
+    if res.status_code not in (200, 206):
+        raise FileURLRetrievalError(
+            f"Failed to retrieve file metadata (HTTP {res.status_code}): {url}"
+        )
+
+    name = None
+    if "Content-Disposition" in res.headers:
+        name = _get_filename_from_response(response=res)
+    file_stat = FileStat(
+        id=file_id,
+        name=name,
+        size=_get_size_from_response(response=res),
+        modified_time=_get_modified_time_from_response(response=res),
+        accept_ranges=_accepts_ranges(response=res),
+    )
+    if cache_ttl is not None and file_id is not None:
+        with _stat_cache_lock:
+            _stat_cache[(file_id, format)] = (time.time(), file_stat)
+    return file_stat
+
+
+def stat_many(
+    ids: Iterable[str],
+    max_workers: int = 8,
+    format: str | None = None,
+    proxy: str | None = None,
+    use_cookies: bool = True,
+    verify: bool | str = True,
+    user_agent: str | None = None,
+    cache_ttl: float | None = None,
+) -> list[FileStat | Exception]:
+    """Get metadata of many Google Drive files concurrently.
+
+    The files are probed like `stat` over a session shared by the workers.
+
+    Parameters
+    ----------
+    ids:
+        Google Drive's file IDs.
+    max_workers:
+        Number of files to probe at a time. Default is 8.
+    format:
+        Format of Google Docs, Spreadsheets and Slides. See `download`.
+    proxy:
+        Proxy.
+    use_cookies:
+        Flag to use cookies. Default is True.
+    verify:
+        Either a bool, in which case it controls whether the server's TLS
+        certificate is verified, or a string, in which case it must be a path
+        to a CA bundle to use. Default is True.
+    user_agent:
+        User-agent to use in the HTTP request.
+    cache_ttl:
+        Seconds to reuse the metadata of files probed before. See `stat`.
+
+    Returns
+    -------
+    file_stats:
+        FileStat of each ID in the order of ids, or the exception raised while
+        probing it.
+
+    Raises
+    ------
+    ValueError
+        If max_workers is not positive.
+    """
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be positive: {max_workers}")
+    ids = list(ids)
+
+    sess, _ = _get_session(
+        proxy=proxy,
+        use_cookies=use_cookies,
+        user_agent=_FILE_USER_AGENT if user_agent is None else user_agent,
+        pool_maxsize=max_workers,
+    )
+
+    def stat_or_error(id: str) -> FileStat | Exception:
+        try:
+            return stat(
+                id=id,
+                format=format,
+                use_cookies=use_cookies,
+                verify=verify,
+                session=sess,
+                cache_ttl=cache_ttl,
+            )
+        except Exception as e:
+            return e
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(stat_or_error, ids))
+    finally:
+        sess.close()
+
+
+def _get_cached_stat(file_id: str, format: str | None, ttl: float) -> FileStat | None:
+    with _stat_cache_lock:
+        cached = _stat_cache.get((file_id, format))
+    if cached is not None and time.time() - cached[0] <= ttl:
+        return cached[1]
+
+    resolved = _get_resolved_url(file_id=file_id, format=format, ttl=ttl)
+    if resolved is None or resolved.size is None or resolved.filename is None:
+        return None
+    return FileStat(
+        id=file_id,
+        name=resolved.filename,
+        size=resolved.size,
+        modified_time=None
+        if resolved.last_modified is None
+        else email.utils.parsedate_to_datetime(resolved.last_modified),
+        accept_ranges=resolved.accept_ranges,
+    )
@@ -0,0 +1,68 @@
+import collections
+import hashlib
+import json
+import os
+import os.path as osp
+import time
+
+from .json_file import _dump_json_atomic
+
+url_cache_root = osp.join(osp.expanduser("~"), ".cache/gdown/urls")
+
+_ResolvedURL = collections.namedtuple(
+    "_ResolvedURL",
+    ("url", "filename", "last_modified", "resolved_at", "size", "accept_ranges"),
+    defaults=(None, None),
+)
+
+
+def _get_cache_path(file_id: str, format: str | None) -> str:
+    key = json.dumps([file_id, format])
+    return osp.join(url_cache_root, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+
+def _get_resolved_url(
+    file_id: str, format: str | None, ttl: float
+) -> _ResolvedURL | None:
+    try:
+        with open(_get_cache_path(file_id=file_id, format=format)) as f:
+            resolved = _ResolvedURL(**json.load(f))
+    except (OSError, TypeError, ValueError):
+        return None
+    if time.time() - resolved.resolved_at > ttl:
+        return None
+    return resolved
+
+
+def _set_resolved_url(
+    file_id: str,
+    format: str | None,
+    url: str,
+    filename: str | None,
+    last_modified: str | None,
+    size: int | None = None,
+    accept_ranges: bool | None = None,
+) -> None:
+    resolved = _ResolvedURL(
+        url=url,
+        filename=filename,
+        last_modified=last_modified,
+        resolved_at=time.time(),
+        size=size,
+        accept_ranges=accept_ranges,
+    )
+    # The cache only saves round trips, so failing to write it is not an error.
+    try:
+        _dump_json_atomic(
+            path=_get_cache_path(file_id=file_id, format=format),
+            obj=resolved._asdict(),
+        )
+    except OSError:
+        pass
+
+
+def _drop_resolved_url(file_id: str, format: str | None) -> None:
+    try:
+        os.remove(_get_cache_path(file_id=file_id, format=format))
+    except OSError:
+        pass
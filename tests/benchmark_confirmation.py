@@ -0,0 +1,100 @@
+"""Times get_url_from_gdrive_confirmation on confirmation pages.
+
+The pages under tests/data are trimmed to the markup that is parsed, so they
+are padded here with an inline stylesheet and script of --lines lines, as
+Drive serves its pages. The per-line parsing that preceded the one-pass scan
+is timed for comparison.
+
+Usage: python -m tests.benchmark_confirmation [--lines 500] [--number 20]
+"""
+
+import argparse
+import os.path as osp
+import re
+import timeit
+import urllib.parse
+from collections.abc import Callable
+
+import bs4
+
+from gdown.download import get_url_from_gdrive_confirmation
+from gdown.exceptions import FileURLRetrievalError
+
+here = osp.dirname(osp.abspath(__file__))
+
+PAGES = [
+    "confirmation-download-form.html",
+    "confirmation-download-link.html",
+    "confirmation-download-url.html",
+    "confirmation-quota-error.html",
+]
+
+
+def _pad(contents: str, n_lines: int) -> str:
+    style = [
+        f".uc-rule-{i} {{ margin: {i % 16}px; color: #{i:06x}; }}"
+        for i in range(n_lines // 2)
+    ]
+    script = [
+        f'  window[\'_gd_{i}\'] = {{"k":"v{i}","n":{i}}};'
+        for i in range(n_lines - len(style))
+    ]
+    head = "\n".join(["<style>", *style, "</style>", "<script>", *script, "</script>"])
+    return contents.replace("</head>", f"{head}\n</head>", 1)
+
+
+def _get_url_per_line(contents: str) -> str:
+    """Parses the page as before the one-pass scan, with a soup per line."""
+    for line in contents.splitlines():
+        m = re.search(r'href="(\/uc\?export=download[^"]+)', line)
+        if m:
+            return ("https://docs.google.com" + m.groups()[0]).replace("&amp;", "&")
+        soup = bs4.BeautifulSoup(line, features="html.parser")
+        form = soup.select_one("#download-form")
+        if form is not None:
+            action = form["action"]
+            assert isinstance(action, str)
+            url_components = urllib.parse.urlsplit(action.replace("&amp;", "&"))
+            query_params = urllib.parse.parse_qs(url_components.query)
+            for param in form.find_all("input", attrs={"type": "hidden"}):
+                query_params[str(param["name"])] = [str(param["value"])]
+            query = urllib.parse.urlencode(query_params, doseq=True)
+            return urllib.parse.urlunsplit(url_components._replace(query=query))
+        m = re.search('"downloadUrl":"([^"]+)', line)
+        if m:
+            return m.groups()[0].replace("\\u003d", "=").replace("\\u0026", "&")
+        m = re.search('<p class="uc-error-subcaption">(.*)</p>', line)
+        if m:
+            raise FileURLRetrievalError(m.groups()[0])
+    raise FileURLRetrievalError("Cannot retrieve the public link of the file.")
+
+
+def _time(func: Callable[[str], str], contents: str, number: int) -> float:
+    def run() -> None:
+        try:
+            func(contents)
+        except FileURLRetrievalError:
+            pass
+
+    return min(timeit.repeat(run, number=number, repeat=5)) / number
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="time get_url_from_gdrive_confirmation on padded pages"
+    )
+    parser.add_argument("--lines", type=int, default=500, help="lines to pad with")
+    parser.add_argument("--number", type=int, default=20, help="calls per timing")
+    args = parser.parse_args()
+
+    print(f"{'page':<36s} {'per line':>10s} {'one pass':>10s}")
+    for page in PAGES:
+        with open(osp.join(here, "data", page)) as f:
+            contents = _pad(f.read(), n_lines=args.lines)
+        before = _time(_get_url_per_line, contents, number=args.number)
+        after = _time(get_url_from_gdrive_confirmation, contents, number=args.number)
+        print(f"{page:<36s} {before * 1e3:>8.2f}ms {after * 1e3:>8.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
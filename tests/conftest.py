@@ -1,5 +1,108 @@
+import http.server
+import os
+import threading
+from collections.abc import Callable
+from collections.abc import Iterator
 from typing import Final
+from typing import NamedTuple
+
+import pytest
+
+from gdown.download import CHUNK_SIZE
+from gdown.download_folder import _GoogleDriveFile
 
 GITHUB_RELEASE_URL: Final = (
     "https://github.com/wkentaro/gdown/archive/refs/tags/v4.0.0.tar.gz"
 )
+
+
+def fake_parse_embedded_folder_view(
+    root: _GoogleDriveFile,
+) -> Callable[..., tuple[str, list[tuple[str, str, str]]]]:
+    """Serves the folder pages of a _GoogleDriveFile tree without network.
+
+    The root page is served for any folder ID outside the tree, so that tests
+    can pass a dummy folder URL.
+    """
+    pages: dict[str, tuple[str, list[tuple[str, str, str]]]] = {}
+
+    def add(folder: _GoogleDriveFile) -> None:
+        pages[folder.id] = (
+            folder.name,
+            [(child.id, child.name, child.type) for child in folder.children],
+        )
+        for child in folder.children:
+            if child.is_folder():
+                add(child)
+
+    add(root)
+    return lambda sess, folder_id, verify=True: pages.get(folder_id, pages[root.id])
+
+
+class FileServer(NamedTuple):
+    url: str
+    data: bytes
+    # Ports of the connections requests came from.
+    client_ports: list[int]
+    # Responses to send only the first half of.
+    truncate: list[bool]
+    # Responses to send with chunked encoding instead of Content-Length.
+    chunked: list[bool]
+
+
+@pytest.fixture
+def file_server() -> Iterator[FileServer]:
+    """Serves random data over HTTP on localhost, honouring Range."""
+    data = os.urandom(3 * CHUNK_SIZE + 123)
+    client_ports: list[int] = []
+    truncate: list[bool] = []
+    chunked: list[bool] = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self) -> None:
+            client_ports.append(self.client_address[1])
+            start, end = 0, len(data) - 1
+            if "Range" in self.headers:
+                first, last = self.headers["Range"][len("bytes=") :].split("-")
+                start, end = int(first), int(last or end)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            else:
+                self.send_response(200)
+            body = data[start : end + 1]
+            self.send_header("Content-Disposition", 'attachment; filename="data.bin"')
+            if chunked and chunked.pop(0):
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for i in range(0, len(body), CHUNK_SIZE):
+                    chunk = body[i : i + CHUNK_SIZE]
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if truncate and truncate.pop(0):
+                self.wfile.write(body[: len(body) // 2])
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield FileServer(
+            url=f"http://127.0.0.1:{server.server_port}/data.bin",
+            data=data,
+            client_ports=client_ports,
+            truncate=truncate,
+            chunked=chunked,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,3 +1,4 @@
+import datetime
 import hashlib
 import json
 import os
@@ -13,8 +14,10 @@ from gdown.__main__ import main
 from gdown.cached_download import _assert_filehash
 from gdown.cached_download import _compute_filehash
 from gdown.download_folder import _GoogleDriveFile
+from gdown.stat import FileStat
 
 from .conftest import GITHUB_RELEASE_URL
+from .conftest import fake_parse_embedded_folder_view
 
 here = os.path.dirname(os.path.abspath(__file__))
 
@@ -159,6 +162,21 @@ def test_download_slides_from_gdrive() -> None:
     _test_cli_with_md5(url_or_id=file_id, md5=md5, options=["--format", "pdf"])
 
 
+def _fake_stat_many(ids: list[str], **kwargs: object) -> list[FileStat]:
+    return [
+        FileStat(
+            id=id,
+            name="track.mp3",
+            size=1024,
+            modified_time=datetime.datetime(
+                2015, 10, 21, 7, 28, tzinfo=datetime.timezone.utc
+            ),
+            accept_ranges=True,
+        )
+        for id in ids
+    ]
+
+
 def test_json_flag_outputs_json_array(
     monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
 ) -> None:
@@ -184,12 +202,18 @@ def test_json_flag_outputs_json_array(
             "--json",
         ],
     )
-    with unittest.mock.patch.object(
-        sys.modules["gdown.download_folder"],
-        "_download_and_parse_google_drive_link",
-        return_value=root,
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ),
+        unittest.mock.patch(
+            "gdown.__main__.stat_many", side_effect=_fake_stat_many
+        ) as mock_stat_many,
     ):
         main()
+    assert mock_stat_many.call_args.kwargs["max_workers"] == 8
 
     captured = capsys.readouterr()
     entries = json.loads(captured.out)
@@ -197,6 +221,8 @@ def test_json_flag_outputs_json_array(
         {
             "url": "https://drive.google.com/uc?id=child_id",
             "path": "track.mp3",
+            "size": 1024,
+            "modified_time": "2015-10-21T07:28:00+00:00",
         }
     ]
 
@@ -231,14 +257,22 @@ def test_json_flag_preserves_subfolder_path(
             "https://drive.google.com/drive/folders/dummy",
             "--folder",
             "--json",
+            "--jobs",
+            "2",
         ],
     )
-    with unittest.mock.patch.object(
-        sys.modules["gdown.download_folder"],
-        "_download_and_parse_google_drive_link",
-        return_value=root,
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ),
+        unittest.mock.patch(
+            "gdown.__main__.stat_many", side_effect=_fake_stat_many
+        ) as mock_stat_many,
     ):
         main()
+    assert mock_stat_many.call_args.kwargs["max_workers"] == 2
 
     captured = capsys.readouterr()
     entries = json.loads(captured.out)
@@ -246,6 +280,8 @@ def test_json_flag_preserves_subfolder_path(
         {
             "url": "https://drive.google.com/uc?id=nested_id",
             "path": "album/track.mp3",
+            "size": 1024,
+            "modified_time": "2015-10-21T07:28:00+00:00",
         }
     ]
 
@@ -278,12 +314,13 @@ def test_json_flag_does_not_download(
     with (
         unittest.mock.patch.object(
             sys.modules["gdown.download_folder"],
-            "_download_and_parse_google_drive_link",
-            return_value=root,
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
         ),
         unittest.mock.patch.object(
             sys.modules["gdown.download_folder"], "download"
         ) as mock_download,
+        unittest.mock.patch("gdown.__main__.stat_many", side_effect=_fake_stat_many),
     ):
         main()
 
@@ -334,6 +371,8 @@ def test_json_flag_single_file_outputs_array(
         {
             "Content-Type": "application/octet-stream",
             "Content-Disposition": 'attachment; filename="video.webm"',
+            "Content-Length": "1024",
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
         }
     )
     with unittest.mock.patch.object(
@@ -347,8 +386,11 @@ def test_json_flag_single_file_outputs_array(
         {
             "url": "https://drive.google.com/uc?id=child_id",
             "path": "video.webm",
+            "size": 1024,
+            "modified_time": "2015-10-21T07:28:00+00:00",
         }
     ]
+    sess.get.return_value.iter_content.assert_not_called()
 
 
 def test_json_flag_single_file_without_drive_filename_raises(
@@ -374,6 +416,26 @@ def test_json_flag_single_file_without_drive_filename_raises(
         main()
 
 
+@pytest.mark.parametrize(
+    "option",
+    [
+        ["--connections", "0"],
+        ["--jobs", "0"],
+        ["--retries", "-1"],
+    ],
+)
+def test_main_rejects_invalid_option(
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+    option: list[str],
+) -> None:
+    monkeypatch.setattr(sys, "argv", ["gdown", "https://example.com/file", *option])
+    with pytest.raises(SystemExit) as e:
+        main()
+    assert e.value.code == 2
+    assert f"{option[0]} must" in capsys.readouterr().err
+
+
 @pytest.mark.parametrize(
     "argv, expected",
     [
@@ -394,3 +456,18 @@ def test_file_size_none_returns_none() -> None:
 def test_file_size_without_unit_raises_type_error() -> None:
     with pytest.raises(TypeError):
         file_size("100")
+
+
+def test_cache_prune(capsys: pytest.CaptureFixture[str]) -> None:
+    with unittest.mock.patch(
+        "gdown.__main__._prune_cache", return_value=(["a"], 1, 1024)
+    ) as mock_prune_cache:
+        with unittest.mock.patch.object(
+            sys, "argv", ["gdown", "cache", "prune", "--max-size", "1KB"]
+        ):
+            main()
+    mock_prune_cache.assert_called_once_with(max_bytes=1024)
+    out = capsys.readouterr().out
+    assert "Removed a" in out
+    assert "Files: 1" in out
+    assert "Size: 1.00kB" in out
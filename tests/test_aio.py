@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import os.path as osp
+import sys
+import threading
+import time
+import unittest.mock
+from pathlib import Path
+
+import pytest
+
+import gdown
+from gdown.download import _get_part_path
+from gdown.download_folder import _GoogleDriveFile
+
+from .conftest import FileServer
+from .conftest import fake_parse_embedded_folder_view
+
+
+@pytest.mark.parametrize("chunked", [False, True])
+def test_adownload(tmp_path: Path, file_server: FileServer, chunked: bool) -> None:
+    file_server.chunked.append(chunked)
+    digests = {"sha256": ""}
+    reported: list[tuple[int, int | None]] = []
+
+    output = asyncio.run(
+        gdown.adownload(
+            url=file_server.url,
+            output=str(tmp_path) + "/",
+            quiet=True,
+            use_cookies=False,
+            digests=digests,
+            progress=lambda current, total: reported.append((current, total)),
+        )
+    )
+
+    assert output == str(tmp_path / "data.bin")
+    assert (tmp_path / "data.bin").read_bytes() == file_server.data
+    expected = hashlib.sha256(file_server.data).hexdigest()
+    assert digests == {"sha256": f"sha256:{expected}"}
+    size = len(file_server.data)
+    assert reported[-1] == (size, None if chunked else size)
+
+
+def test_adownload_resumes_body_cut_short(
+    tmp_path: Path, file_server: FileServer
+) -> None:
+    file_server.truncate.append(True)
+
+    with unittest.mock.patch("asyncio.sleep", unittest.mock.AsyncMock()):
+        asyncio.run(
+            gdown.adownload(
+                url=file_server.url,
+                output=str(tmp_path / "out"),
+                quiet=True,
+                use_cookies=False,
+                retries=1,
+            )
+        )
+
+    assert (tmp_path / "out").read_bytes() == file_server.data
+
+
+def test_adownload_cancel_keeps_part(tmp_path: Path, file_server: FileServer) -> None:
+    output = str(tmp_path / "out")
+
+    def cancel(current: int, total: int | None) -> None:
+        task = asyncio.current_task()
+        assert task is not None
+        task.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(
+            gdown.adownload(
+                url=file_server.url,
+                output=output,
+                quiet=True,
+                use_cookies=False,
+                progress=cancel,
+            )
+        )
+    part_path = _get_part_path(output=output, source=[file_server.url, None])
+    part_size = osp.getsize(part_path)
+    assert 0 < part_size < len(file_server.data)
+    assert not osp.exists(output)
+
+    asyncio.run(
+        gdown.adownload(
+            url=file_server.url,
+            output=output,
+            quiet=True,
+            use_cookies=False,
+            resume=True,
+        )
+    )
+    assert Path(output).read_bytes() == file_server.data
+    assert not osp.exists(part_path)
+
+
+def test_acached_download(tmp_path: Path, file_server: FileServer) -> None:
+    path = str(tmp_path / "out")
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        for _ in range(2):
+            assert (
+                asyncio.run(
+                    gdown.acached_download(
+                        url=file_server.url, path=path, quiet=True, use_cookies=False
+                    )
+                )
+                == path
+            )
+
+    assert Path(path).read_bytes() == file_server.data
+    # The second call is a cache hit.
+    assert len(file_server.client_ports) == 1
+
+
+def test_acached_download_cancel_stops_download(
+    tmp_path: Path, file_server: FileServer
+) -> None:
+    path = str(tmp_path / "out")
+    chunks_after_cancel = 0
+
+    async def download_and_cancel() -> None:
+        loop = asyncio.get_running_loop()
+        cancelled = threading.Event()
+
+        def cancel(current: int, total: int | None) -> None:
+            nonlocal chunks_after_cancel
+            if cancelled.is_set():
+                chunks_after_cancel += 1
+            cancelled.set()
+            loop.call_soon_threadsafe(task.cancel)
+            # Give the event loop time to cancel before the next chunk.
+            time.sleep(0.1)
+
+        task = asyncio.create_task(
+            gdown.acached_download(
+                url=file_server.url,
+                path=path,
+                quiet=True,
+                use_cookies=False,
+                progress=cancel,
+            )
+        )
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        asyncio.run(download_and_cancel())
+        assert chunks_after_cancel == 0
+        assert not osp.exists(path)
+
+        # The lock was released when the coroutine returned.
+        gdown.cached_download(url=file_server.url, path=path, quiet=True)
+
+    assert Path(path).read_bytes() == file_server.data
+
+
+def _folder(n_files: int) -> _GoogleDriveFile:
+    return _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id=f"id_{i}", name=f"file_{i}.txt", type="text/plain")
+            for i in range(n_files)
+        ],
+    )
+
+
+def test_adownload_folder(tmp_path: Path) -> None:
+    running = 0
+    max_running = 0
+
+    async def fake_adownload(url: str, output: str, **kwargs: object) -> str:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        # Finish in reverse order.
+        await asyncio.sleep(0.01 * (10 - int(url.rsplit("_", 1)[1])))
+        running -= 1
+        return output
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(_folder(n_files=8)),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.aio"], "adownload", side_effect=fake_adownload
+        ),
+    ):
+        files = asyncio.run(
+            gdown.adownload_folder(
+                id="root_id", output=str(tmp_path), quiet=True, max_workers=3
+            )
+        )
+
+    assert files == [osp.join(str(tmp_path), f"file_{i}.txt") for i in range(8)]
+    assert max_running == 3
+
+
+def test_adownload_folder_cancel_stops_downloads(tmp_path: Path) -> None:
+    started = 0
+    stopped = 0
+
+    async def fake_adownload(url: str, output: str, **kwargs: object) -> str:
+        nonlocal started, stopped
+        started += 1
+        try:
+            await asyncio.sleep(60)
+        finally:
+            stopped += 1
+        return output
+
+    async def download_folder_and_cancel() -> None:
+        task = asyncio.create_task(
+            gdown.adownload_folder(
+                id="root_id", output=str(tmp_path), quiet=True, max_workers=2
+            )
+        )
+        while started < 2:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(_folder(n_files=4)),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.aio"], "adownload", side_effect=fake_adownload
+        ),
+    ):
+        asyncio.run(download_folder_and_cancel())
+
+    assert started == stopped == 2
@@ -1,9 +1,24 @@
+import concurrent.futures
+import functools
+import hashlib
+import json
 import os
+import sys
 import tempfile
+import threading
+import time
+import unittest.mock
+from pathlib import Path
 
 import pytest
 
 import gdown
+from gdown.cached_download import _compute_filehash
+from gdown.cached_download import _get_object_path
+from gdown.cached_download import _get_postprocess_id
+from gdown.cached_download import _lease
+from gdown.cached_download import _prune_cache
+from gdown.cached_download import _record_cache_access
 
 
 def _cached_download(hash: str) -> None:
@@ -30,3 +45,447 @@ def test_cached_download_sha256() -> None:
     _cached_download(
         hash="sha256:284e3029cce3ae5ee0b05866100e300046359f53ae4c77fe6b34c05aa7a72cee"
     )
+
+
+def _fake_session(data: bytes) -> unittest.mock.Mock:
+    response = unittest.mock.Mock()
+    response.status_code = 200
+    response.url = "https://example.com/data.bin"
+    response.headers = {"Content-Length": str(len(data))}
+    response.iter_content = lambda chunk_size: [data]
+    sess = unittest.mock.Mock()
+    sess.get.return_value = response
+    return sess
+
+
+def test_cached_download_hashes_while_downloading(tmp_path: Path) -> None:
+    data = b"spam\n" * 100
+    hash = "sha256:" + hashlib.sha256(data).hexdigest()
+    path = str(tmp_path / "data.bin")
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(_fake_session(data), str(tmp_path / "cookies.txt")),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"], "_compute_filehash"
+        ) as mock_compute_filehash,
+    ):
+        gdown.cached_download(
+            url="https://example.com/data.bin", path=path, hash=hash, quiet=True
+        )
+        with pytest.raises(AssertionError, match="File hash doesn't match"):
+            gdown.cached_download(
+                url="https://example.com/data.bin",
+                path=str(tmp_path / "other.bin"),
+                hash="sha256:" + "0" * 64,
+                quiet=True,
+            )
+
+    mock_compute_filehash.assert_not_called()
+    assert Path(path).read_bytes() == data
+    assert not (tmp_path / "other.bin").exists()
+
+
+def test_cached_download_trusts_recorded_hash(tmp_path: Path) -> None:
+    data = b"spam\n"
+    hash = "sha256:" + hashlib.sha256(data).hexdigest()
+    path = tmp_path / "data.bin"
+    path.write_bytes(data)
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        with unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"],
+            "_compute_filehash",
+            wraps=_compute_filehash,
+        ) as mock_compute_filehash:
+            for _ in range(3):
+                gdown.cached_download(path=str(path), hash=hash, quiet=True)
+            assert mock_compute_filehash.call_count == 1
+
+            gdown.cached_download(
+                path=str(path), hash=hash, quiet=True, verify_hash="always"
+            )
+            assert mock_compute_filehash.call_count == 2
+
+        # A changed file is hashed again and no longer matches.
+        path.write_bytes(b"eggs\n")
+        with unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(_fake_session(data), str(tmp_path / "cookies.txt")),
+        ):
+            gdown.cached_download(
+                url="https://example.com/data.bin",
+                path=str(path),
+                hash=hash,
+                quiet=True,
+            )
+    assert path.read_bytes() == data
+
+
+def test_cached_download_single_flight(tmp_path: Path) -> None:
+    path = str(tmp_path / "data.bin")
+    started = threading.Event()
+
+    def fake_download(output: str, **kwargs: object) -> str:
+        started.set()
+        time.sleep(0.2)
+        Path(output).write_bytes(b"spam\n")
+        return output
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"], "cache_root", str(tmp_path)
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"],
+            "download",
+            side_effect=fake_download,
+        ) as mock_download,
+        concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor,
+    ):
+        futures = [
+            executor.submit(
+                gdown.cached_download,
+                url="https://example.com/data.bin",
+                path=path,
+                quiet=True,
+            )
+        ]
+        started.wait()
+        futures += [
+            executor.submit(
+                gdown.cached_download,
+                url="https://example.com/data.bin",
+                path=path,
+                quiet=True,
+            )
+            for _ in range(3)
+        ]
+        assert [future.result() for future in futures] == [path] * 4
+
+    assert mock_download.call_count == 1
+    assert Path(path).read_bytes() == b"spam\n"
+
+
+def test_cached_download_evicts_least_recently_used(tmp_path: Path) -> None:
+    def fake_download(output: str, **kwargs: object) -> str:
+        Path(output).write_bytes(b"x" * 10)
+        return output
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"], "cache_root", str(tmp_path)
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"],
+            "download",
+            side_effect=fake_download,
+        ),
+    ):
+        for name in ["a", "b", "c"]:
+            gdown.cached_download(
+                url=f"https://example.com/{name}",
+                path=str(tmp_path / name),
+                quiet=True,
+                cache_max_bytes=25,
+            )
+            if name == "b":
+                # Accessing a makes b the least recently used.
+                gdown.cached_download(path=str(tmp_path / "a"), quiet=True)
+
+        assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == [
+            "_index.json",
+            "_index.lock",
+            "a",
+            "c",
+        ]
+
+        evicted, count, total = _prune_cache(max_bytes=0)
+    assert evicted == [str(tmp_path / "a"), str(tmp_path / "c")]
+    assert (count, total) == (0, 0)
+
+
+def test_cached_download_logs_hits_without_rewriting_index(tmp_path: Path) -> None:
+    sess = _fake_session(b"spam\n")
+    path = str(tmp_path / "data.bin")
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path)
+    ):
+        gdown.cached_download(
+            url="https://example.com/data.bin", path=path, quiet=True, session=sess
+        )
+        index = (tmp_path / "_index.json").read_text()
+        accessed = json.loads(index)["data.bin"]["accessed"]
+        gdown.cached_download(path=path, quiet=True)
+        assert (tmp_path / "_index.json").read_text() == index
+        assert (tmp_path / "_hits.jsonl").exists()
+
+        # The hits are merged into the index when it is next written.
+        _prune_cache(max_bytes=100)
+    assert not (tmp_path / "_hits.jsonl").exists()
+    index = json.loads((tmp_path / "_index.json").read_text())
+    assert index["data.bin"]["accessed"] > accessed
+
+
+def test_prune_cache_skips_leased_files(tmp_path: Path) -> None:
+    path = str(tmp_path / "data.bin")
+    Path(path).write_bytes(b"spam\n")
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path)
+    ):
+        _record_cache_access(path=path)
+        leased = threading.Event()
+        release = threading.Event()
+
+        def hold_lease() -> None:
+            with _lease(path=path):
+                leased.set()
+                release.wait(timeout=5)
+
+        thread = threading.Thread(target=hold_lease)
+        thread.start()
+        assert leased.wait(timeout=5)
+        assert _prune_cache(max_bytes=0)[0] == []
+        release.set()
+        thread.join()
+        assert _prune_cache(max_bytes=0)[0] == [path]
+
+
+def test_cached_download_deduplicates_by_hash(tmp_path: Path) -> None:
+    data = b"spam\n" * 100
+    hash = "sha256:" + hashlib.sha256(data).hexdigest()
+    sess = _fake_session(data)
+    sess.get.return_value.headers.update(
+        {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": 'attachment; filename="data.bin"',
+            "ETag": '"1"',
+        }
+    )
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(sess, str(tmp_path / "cookies.txt")),
+        ),
+    ):
+        for i, url in enumerate(
+            [
+                "https://drive.google.com/uc?id=0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+                "https://drive.google.com/file/d/0B9P1L--7Wd2vU3VUVlFnbTgtS2c/view",
+            ]
+        ):
+            gdown.cached_download(
+                url=url,
+                path=str(tmp_path / f"{i}.bin"),
+                hash=hash,
+                quiet=True,
+                use_cookies=False,
+            )
+        # Without a hash, the file is found through its reference once the
+        # server confirms it is unchanged, with a request of its headers.
+        gdown.cached_download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            path=str(tmp_path / "2.bin"),
+            quiet=True,
+            use_cookies=False,
+            revalidate=True,
+        )
+        object_path = _get_object_path(hash=hash)
+
+    assert sess.get.call_count == 2
+    for i in range(3):
+        assert (tmp_path / f"{i}.bin").read_bytes() == data
+        assert os.path.samefile(tmp_path / f"{i}.bin", object_path)
+
+
+def test_cached_download_without_hash_ignores_stale_reference(
+    tmp_path: Path,
+) -> None:
+    hash = "sha256:" + hashlib.sha256(b"spam\n").hexdigest()
+    sess = _fake_session(b"spam\n")
+    sess.get.return_value.headers["ETag"] = '"1"'
+    url = "https://example.com/data.bin"
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        gdown.cached_download(
+            url=url, path=str(tmp_path / "0.bin"), hash=hash, quiet=True, session=sess
+        )
+
+        sess.get.return_value.headers.update({"ETag": '"2"', "Content-Length": "5"})
+        sess.get.return_value.iter_content = lambda chunk_size: [b"eggs\n"]
+        for i, revalidate in [(1, False), (2, True)]:
+            gdown.cached_download(
+                url=url,
+                path=str(tmp_path / f"{i}.bin"),
+                quiet=True,
+                revalidate=revalidate,
+                session=sess,
+            )
+            assert (tmp_path / f"{i}.bin").read_bytes() == b"eggs\n"
+
+
+def test_cached_download_indexes_hardlinks_with_object(tmp_path: Path) -> None:
+    data = b"spam\n" * 100
+    hash = "sha256:" + hashlib.sha256(data).hexdigest()
+    sess = _fake_session(data)
+    cache = tmp_path / "cache"
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(cache)
+    ):
+        for _ in range(2):
+            path = gdown.cached_download(
+                url="https://example.com/data.bin",
+                hash=hash,
+                quiet=True,
+                session=sess,
+            )
+        object_path = _get_object_path(hash=hash)
+        assert os.path.samefile(path, object_path)
+
+        # The link at the default path is counted with the object only once.
+        evicted, count, total = _prune_cache(max_bytes=len(data))
+        assert (evicted, count, total) == ([], 1, len(data))
+
+        evicted, count, total = _prune_cache(max_bytes=0)
+    assert sorted(evicted) == sorted([path, object_path])
+    assert (count, total) == (0, 0)
+    assert not os.path.exists(path)
+    assert not os.path.exists(object_path)
+
+
+def test_cached_download_revalidates(tmp_path: Path) -> None:
+    sess = _fake_session(b"spam\n")
+    sess.get.return_value.headers["ETag"] = '"1"'
+    path = str(tmp_path / "data.bin")
+
+    def cached_download(revalidate: bool = False, max_age: float | None = None) -> None:
+        gdown.cached_download(
+            url="https://example.com/data.bin",
+            path=path,
+            quiet=True,
+            revalidate=revalidate,
+            max_age=max_age,
+            session=sess,
+        )
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        cached_download()
+        assert sess.get.call_count == 1
+
+        # Unchanged on the server: only the headers are requested.
+        cached_download(revalidate=True)
+        assert sess.get.call_count == 2
+        cached_download(max_age=60)
+        assert sess.get.call_count == 2
+
+        sess.get.return_value.headers["ETag"] = '"2"'
+        sess.get.return_value.iter_content = lambda chunk_size: [b"eggs\n"]
+        cached_download(max_age=60)
+        assert sess.get.call_count == 2
+        cached_download(revalidate=True)
+        assert sess.get.call_count == 4
+
+    assert Path(path).read_bytes() == b"eggs\n"
+
+
+def test_cached_download_revalidate_rejects_hash() -> None:
+    with pytest.raises(ValueError, match="can't be combined with hash"):
+        gdown.cached_download(
+            url="https://example.com/data.bin", hash="md5:0", revalidate=True
+        )
+
+
+def test_cached_download_postprocesses_once(tmp_path: Path) -> None:
+    sess = _fake_session(b"spam\n")
+    path = str(tmp_path / "data.bin")
+    postprocess = unittest.mock.Mock(side_effect=[KeyboardInterrupt, None])
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        with pytest.raises(KeyboardInterrupt):
+            gdown.cached_download(
+                url="https://example.com/data.bin",
+                path=path,
+                quiet=True,
+                session=sess,
+                postprocess=postprocess,
+                postprocess_key="postprocess",
+            )
+        # The interrupted postprocess runs again, without downloading again.
+        for _ in range(2):
+            gdown.cached_download(
+                url="https://example.com/data.bin",
+                path=path,
+                quiet=True,
+                session=sess,
+                postprocess=postprocess,
+                postprocess_key="postprocess",
+            )
+
+    assert sess.get.call_count == 1
+    assert postprocess.call_count == 2
+
+
+def test_cached_download_postprocesses_anonymous_after_download(
+    tmp_path: Path,
+) -> None:
+    sess = _fake_session(b"spam\n")
+    path = str(tmp_path / "data.bin")
+    postprocessed: list[str] = []
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.cached_download"], "cache_root", str(tmp_path / "cache")
+    ):
+        for _ in range(3):
+            gdown.cached_download(
+                url="https://example.com/data.bin",
+                path=path,
+                quiet=True,
+                session=sess,
+                postprocess=lambda path: postprocessed.append(path),
+            )
+
+    # Without an identity, it runs after the download only, not on hits.
+    assert sess.get.call_count == 1
+    assert postprocessed == [path]
+
+
+def test_get_postprocess_id() -> None:
+    extract_a = functools.partial(gdown.extractall, to="a")
+    extract_b = functools.partial(gdown.extractall, to="b")
+    assert _get_postprocess_id(gdown.extractall) == "gdown.extractall.extractall"
+    assert _get_postprocess_id(extract_a) == _get_postprocess_id(
+        functools.partial(gdown.extractall, to="a")
+    )
+    assert _get_postprocess_id(extract_a) != _get_postprocess_id(extract_b)
+
+    def nested(path: str) -> None:
+        pass
+
+    # Different lambdas and nested functions share their names.
+    assert _get_postprocess_id(lambda path: None) is None
+    assert _get_postprocess_id(nested) is None
+    assert _get_postprocess_id(functools.partial(nested)) is None
+    assert _get_postprocess_id(functools.partial(gdown.extractall, to=object())) is None
@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest.mock
+
+import pytest
+import requests
+
+from gdown.concurrency import AdaptiveConcurrency
+from gdown.concurrency import _parse_retry_after
+from gdown.exceptions import FileURLRetrievalError
+from gdown.exceptions import ThrottledError
+
+
+def _http_error(status_code: int, retry_after: str | None = None) -> Exception:
+    response = unittest.mock.Mock()
+    response.status_code = status_code
+    response.headers = {} if retry_after is None else {"Retry-After": retry_after}
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_adaptive_concurrency_aimd() -> None:
+    concurrency = AdaptiveConcurrency(max_limit=8)
+    assert concurrency.limit == 8
+
+    concurrency.acquire()
+    concurrency.report(_http_error(429))
+    # Throttles of transfers started before the decrease don't decrease it again.
+    concurrency.report(ThrottledError("Too many users"))
+    concurrency.release()
+    assert concurrency.limit == 4
+
+    concurrency.acquire()
+    concurrency.report(_http_error(503))
+    concurrency.release()
+    assert concurrency.limit == 2
+
+    for _ in range(10):
+        concurrency.acquire()
+        concurrency.report(FileURLRetrievalError("Permission denied"))
+        concurrency.release()
+    assert concurrency.limit == 2
+
+    # Grows by about one per limit successes.
+    for _ in range(3):
+        with concurrency.slot():
+            concurrency.report(None)
+    assert concurrency.limit == 3
+    for _ in range(100):
+        with concurrency.slot():
+            concurrency.report(None)
+    assert concurrency.limit == 8
+
+
+def test_adaptive_concurrency_limits_slots() -> None:
+    concurrency = AdaptiveConcurrency(max_limit=2)
+    concurrency.acquire()
+    concurrency.acquire()
+    acquired = threading.Event()
+
+    def acquire() -> None:
+        concurrency.acquire()
+        acquired.set()
+
+    thread = threading.Thread(target=acquire)
+    thread.start()
+    assert not acquired.wait(timeout=0.05)
+    concurrency.release()
+    assert acquired.wait(timeout=1)
+    thread.join()
+
+
+def test_adaptive_concurrency_honours_retry_after() -> None:
+    concurrency = AdaptiveConcurrency(max_limit=4)
+    with concurrency.slot():
+        concurrency.report(_http_error(429, retry_after="0.2"))
+    t_start = time.monotonic()
+    with concurrency.slot():
+        pass
+    assert time.monotonic() - t_start >= 0.15
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [
+        (None, None),
+        ("120", 120.0),
+        ("-1", 0.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+        ("soon", None),
+    ],
+)
+def test_parse_retry_after(value: str | None, expected: float | None) -> None:
+    assert _parse_retry_after(value) == expected
+
+
+def test_adaptive_concurrency_invalid_limits() -> None:
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(max_limit=1, min_limit=2)
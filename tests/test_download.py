@@ -1,14 +1,32 @@
+import hashlib
+import json
 import os
+import queue
 import sys
+import threading
 import unittest.mock
+from collections.abc import Iterator
 from pathlib import Path
 from typing import Final
 from typing import NamedTuple
 
 import pytest
+import requests
 
+from gdown.concurrency import AdaptiveConcurrency
+from gdown.download import CHUNK_SIZE
 from gdown.download import GoogleDriveFileToDownload
+from gdown.download import _get_part_path
+from gdown.download import _write_pipelined
 from gdown.download import download
+from gdown.download import get_url_from_gdrive_confirmation
+from gdown.exceptions import DownloadError
+from gdown.exceptions import FileURLRetrievalError
+from gdown.exceptions import ThrottledError
+
+from .conftest import FileServer
+
+here = os.path.dirname(os.path.abspath(__file__))
 
 DOWNLOAD_URL: Final[str] = (
     "https://raw.githubusercontent.com/wkentaro/gdown/3.1.0/gdown/__init__.py"
@@ -200,3 +218,566 @@ def test_download_google_slides_without_extension(tmp_path: Path) -> None:
     )
     assert isinstance(output, str)
     assert output.endswith(".pptx")
+
+
+def _fake_session_serving(data: bytes, honour_range: bool) -> unittest.mock.Mock:
+    def get(
+        url: str, headers: dict[str, str] | None = None, **kwargs: object
+    ) -> unittest.mock.Mock:
+        response = unittest.mock.Mock()
+        response.url = url
+        response.headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": 'attachment; filename="data.bin"',
+        }
+        body = data
+        if honour_range and headers is not None and "Range" in headers:
+            start_str, _, end_str = headers["Range"][len("bytes=") :].partition("-")
+            start = int(start_str)
+            end = int(end_str) if end_str else len(data) - 1
+            body = data[start : end + 1]
+            response.status_code = 206
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+        else:
+            response.status_code = 200
+        response.headers["Content-Length"] = str(len(body))
+        response.iter_content = lambda chunk_size: [
+            body[i : i + chunk_size] for i in range(0, len(body), chunk_size)
+        ]
+        return response
+
+    sess = unittest.mock.Mock()
+    sess.get.side_effect = get
+    sess.cookies = []
+    return sess
+
+
+@pytest.mark.parametrize("honour_range", [True, False])
+def test_download_connections(tmp_path: Path, honour_range: bool) -> None:
+    data = os.urandom(3 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=honour_range)
+    reported: list[int] = []
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"],
+        "_get_session",
+        return_value=(sess, str(tmp_path / "cookies.txt")),
+    ):
+        output = download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            connections=4,
+            progress=lambda current, total: reported.append(current),
+        )
+
+    assert isinstance(output, str)
+    assert Path(output).read_bytes() == data
+    assert max(reported) == len(data)
+    ranges = [
+        call.kwargs["headers"]["Range"]
+        for call in sess.get.call_args_list
+        if call.kwargs.get("headers")
+    ]
+    if honour_range:
+        assert len(ranges) == 4
+    else:
+        assert len(ranges) == 1
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_download_leaves_given_session_open(tmp_path: Path) -> None:
+    sess = _fake_session_serving(data=b"data", honour_range=False)
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"], "_get_session"
+    ) as mock_get_session:
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            session=sess,
+        )
+
+    mock_get_session.assert_not_called()
+    sess.close.assert_not_called()
+    assert (tmp_path / "out").read_bytes() == b"data"
+
+
+def _fake_drive_session(resolved_url: str) -> unittest.mock.Mock:
+    def get(url: str, **kwargs: object) -> unittest.mock.Mock:
+        response = unittest.mock.Mock()
+        response.status_code = 200
+        response.url = url
+        if url == resolved_url:
+            response.headers = {
+                "Content-Type": "application/octet-stream",
+                "Content-Disposition": 'attachment; filename="spam.txt"',
+            }
+            response.iter_content = lambda chunk_size: [b"spam\n"]
+        else:
+            response.headers = {"Content-Type": "text/html; charset=utf-8"}
+            response.text = f'"downloadUrl":"{resolved_url}"'
+        return response
+
+    sess = unittest.mock.Mock()
+    sess.get.side_effect = get
+    sess.cookies = []
+    return sess
+
+
+def test_download_url_cache(tmp_path: Path) -> None:
+    file_id = "0B9P1L--7Wd2vU3VUVlFnbTgtS2c"
+    uc_url = f"https://drive.google.com/uc?id={file_id}"
+
+    def download_with(sess: unittest.mock.Mock) -> list[str]:
+        with unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(sess, str(tmp_path / "cookies.txt")),
+        ):
+            download(
+                id=file_id,
+                output=str(tmp_path / "out"),
+                quiet=True,
+                use_cookies=False,
+                url_cache_ttl=60,
+            )
+        return [c.args[0] for c in sess.get.call_args_list]
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.url_cache"], "url_cache_root", str(tmp_path / "urls")
+    ):
+        # The first download resolves the URL through the confirmation page.
+        assert download_with(_fake_drive_session("https://example.com/v1")) == [
+            uc_url,
+            "https://example.com/v1",
+        ]
+
+        # The second one goes straight to the resolved URL.
+        assert download_with(_fake_drive_session("https://example.com/v1")) == [
+            "https://example.com/v1"
+        ]
+
+        # An expired URL serving HTML is dropped and resolved again.
+        assert download_with(_fake_drive_session("https://example.com/v2")) == [
+            "https://example.com/v1",
+            uc_url,
+            "https://example.com/v2",
+        ]
+        assert download_with(_fake_drive_session("https://example.com/v2")) == [
+            "https://example.com/v2"
+        ]
+
+    assert (tmp_path / "out").read_bytes() == b"spam\n"
+
+
+@pytest.mark.parametrize(
+    "page, expected",
+    [
+        (
+            "confirmation-download-form.html",
+            "https://drive.usercontent.google.com/download"
+            "?id=1ZtS1TSknFt2rr0Y6AFbTtQbQpiN3a9Kz&export=download&confirm=t"
+            "&uuid=6f1d2c8e-3b7a-4e55-9d1c-0a2b3c4d5e6f",
+        ),
+        (
+            "confirmation-download-link.html",
+            "https://docs.google.com/uc?export=download&confirm=a1Bc"
+            "&id=0B9P1L--7Wd2vNm9zMTJWOGxobkU",
+        ),
+        (
+            "confirmation-download-url.html",
+            "https://drive.usercontent.google.com/uc"
+            "?id=1ZtS1TSknFt2rr0Y6AFbTtQbQpiN3a9Kz&export=download",
+        ),
+    ],
+)
+def test_get_url_from_gdrive_confirmation(page: str, expected: str) -> None:
+    contents = Path(here, "data", page).read_text()
+    assert get_url_from_gdrive_confirmation(contents) == expected
+
+
+def test_get_url_from_gdrive_confirmation_quota_error() -> None:
+    contents = Path(here, "data", "confirmation-quota-error.html").read_text()
+    with pytest.raises(ThrottledError, match="^Too many users have viewed"):
+        get_url_from_gdrive_confirmation(contents)
+
+
+def test_get_url_from_gdrive_confirmation_without_link() -> None:
+    with pytest.raises(FileURLRetrievalError, match="Cannot retrieve the public link"):
+        get_url_from_gdrive_confirmation("<html>\n<body>nothing</body>\n</html>")
+
+
+@pytest.mark.parametrize("connections", [1, 4])
+def test_download_digests(tmp_path: Path, connections: int) -> None:
+    data = os.urandom(3 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=True)
+    digests = {"md5": "", "sha256": ""}
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"],
+        "_get_session",
+        return_value=(sess, str(tmp_path / "cookies.txt")),
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            connections=connections,
+            digests=digests,
+        )
+
+    assert digests == {
+        "md5": "md5:" + hashlib.md5(data).hexdigest(),
+        "sha256": "sha256:" + hashlib.sha256(data).hexdigest(),
+    }
+
+
+def test_download_digests_resume(tmp_path: Path) -> None:
+    data = os.urandom(2 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=True)
+    digests = {"sha256": ""}
+
+    def interrupt(current: int, total: int | None) -> None:
+        raise KeyboardInterrupt
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"],
+        "_get_session",
+        return_value=(sess, str(tmp_path / "cookies.txt")),
+    ):
+        with pytest.raises(KeyboardInterrupt):
+            download(
+                id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+                output=str(tmp_path / "out"),
+                quiet=True,
+                use_cookies=False,
+                progress=interrupt,
+            )
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            resume=True,
+            digests=digests,
+        )
+
+    assert sess.get.call_args_list[-1].kwargs["headers"] == {
+        "Range": f"bytes={CHUNK_SIZE}-"
+    }
+    assert (tmp_path / "out").read_bytes() == data
+    assert digests == {"sha256": "sha256:" + hashlib.sha256(data).hexdigest()}
+    assert sorted(os.listdir(tmp_path)) == ["out"]
+
+
+def test_download_resume_discards_part_of_other_version(tmp_path: Path) -> None:
+    data = os.urandom(2 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=True)
+    output = str(tmp_path / "out")
+    part_path = _get_part_path(
+        output=output,
+        source=["https://drive.google.com/uc?id=0B9P1L--7Wd2vU3VUVlFnbTgtS2c", None],
+    )
+    Path(part_path).write_bytes(b"old")
+    Path(f"{part_path}.json").write_text(
+        json.dumps({"validators": {"Content-Length": "3"}})
+    )
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"],
+        "_get_session",
+        return_value=(sess, str(tmp_path / "cookies.txt")),
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=output,
+            quiet=True,
+            use_cookies=False,
+            resume=True,
+        )
+
+    assert all(not c.kwargs.get("headers") for c in sess.get.call_args_list)
+    assert Path(output).read_bytes() == data
+    assert sorted(os.listdir(tmp_path)) == ["out"]
+
+
+@pytest.mark.parametrize("honour_range", [True, False])
+def test_download_retries_dropped_stream(tmp_path: Path, honour_range: bool) -> None:
+    data = os.urandom(2 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=honour_range)
+    get = sess.get.side_effect
+
+    def get_dropping_first(url: str, **kwargs: object) -> unittest.mock.Mock:
+        response = get(url, **kwargs)
+        if sess.get.call_count == 1:
+            chunks = response.iter_content(CHUNK_SIZE)
+
+            def iter_content(chunk_size: int) -> object:
+                yield chunks[0]
+                raise requests.exceptions.ChunkedEncodingError("dropped")
+
+            response.iter_content = iter_content
+        return response
+
+    sess.get.side_effect = get_dropping_first
+    digests = {"sha256": ""}
+    attempts: list[dict[str, object]] = []
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(sess, str(tmp_path / "cookies.txt")),
+        ),
+        unittest.mock.patch("time.sleep") as mock_sleep,
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            digests=digests,
+            retries=2,
+            attempts=attempts,
+        )
+
+    mock_sleep.assert_called_once()
+    assert sess.get.call_args_list[1].kwargs["headers"] == {
+        "Range": f"bytes={CHUNK_SIZE}-"
+    }
+    assert (tmp_path / "out").read_bytes() == data
+    assert digests == {"sha256": "sha256:" + hashlib.sha256(data).hexdigest()}
+    assert [(a["start"], a["bytes"]) for a in attempts] == [
+        (0, CHUNK_SIZE),
+        (CHUNK_SIZE, len(data) - CHUNK_SIZE) if honour_range else (0, len(data)),
+    ]
+    assert isinstance(attempts[0]["error"], requests.exceptions.ChunkedEncodingError)
+    assert attempts[1]["error"] is None
+    assert sorted(os.listdir(tmp_path)) == ["out"]
+
+
+def test_download_retries_exhausted(tmp_path: Path) -> None:
+    sess = _fake_session_serving(data=b"data", honour_range=True)
+    get = sess.get.side_effect
+
+    def get_dropping(url: str, **kwargs: object) -> unittest.mock.Mock:
+        response = get(url, **kwargs)
+        response.iter_content = unittest.mock.Mock(
+            side_effect=requests.exceptions.ConnectionError("reset")
+        )
+        return response
+
+    sess.get.side_effect = get_dropping
+    attempts: list[dict[str, object]] = []
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(sess, str(tmp_path / "cookies.txt")),
+        ),
+        unittest.mock.patch("time.sleep") as mock_sleep,
+        pytest.raises(requests.exceptions.ConnectionError),
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            retries=2,
+            attempts=attempts,
+        )
+
+    assert mock_sleep.call_count == 2
+    assert len(attempts) == 3
+
+
+def test_download_retries_throttled(tmp_path: Path) -> None:
+    sess = _fake_session_serving(data=b"data", honour_range=True)
+    get = sess.get.side_effect
+
+    def get_throttling_first(url: str, **kwargs: object) -> unittest.mock.Mock:
+        if sess.get.call_count == 1:
+            response = unittest.mock.Mock()
+            response.status_code = 429
+            response.headers = {"Content-Type": "text/html", "Retry-After": "30"}
+            return response
+        return get(url, **kwargs)
+
+    sess.get.side_effect = get_throttling_first
+    concurrency = AdaptiveConcurrency(max_limit=4)
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"],
+            "_get_session",
+            return_value=(sess, str(tmp_path / "cookies.txt")),
+        ),
+        unittest.mock.patch("time.sleep") as mock_sleep,
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            retries=1,
+            concurrency=concurrency,
+        )
+
+    mock_sleep.assert_called_once_with(30.0)
+    assert concurrency.limit == 2
+    assert (tmp_path / "out").read_bytes() == b"data"
+
+
+def test_download_pipelined(tmp_path: Path) -> None:
+    data = os.urandom(3 * CHUNK_SIZE + 123)
+    sess = _fake_session_serving(data=data, honour_range=True)
+    digests = {"sha256": ""}
+    reported: list[tuple[int, int | None]] = []
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download"],
+        "_get_session",
+        return_value=(sess, str(tmp_path / "cookies.txt")),
+    ):
+        download(
+            id="0B9P1L--7Wd2vU3VUVlFnbTgtS2c",
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            digests=digests,
+            progress=lambda current, total: reported.append((current, total)),
+            pipeline_depth=2,
+        )
+
+    assert (tmp_path / "out").read_bytes() == data
+    assert digests == {"sha256": "sha256:" + hashlib.sha256(data).hexdigest()}
+    assert reported[-1] == (len(data), len(data))
+
+
+def test_write_pipelined_waits_for_writer() -> None:
+    read: list[bytes] = []
+    written: list[bytes] = []
+    unblock = threading.Event()
+
+    def chunks() -> Iterator[bytes]:
+        for i in range(10):
+            read.append(b"%d" % i)
+            yield read[-1]
+
+    def write(chunk: bytes | memoryview) -> None:
+        unblock.wait()
+        written.append(bytes(chunk))
+
+    thread = threading.Thread(
+        target=_write_pipelined, kwargs=dict(chunks=chunks(), write=write, depth=2)
+    )
+    thread.start()
+    thread.join(timeout=0.1)
+    # One chunk being written, two waiting, and one waiting for room.
+    assert len(read) == 4
+    unblock.set()
+    thread.join()
+    assert written == read
+
+
+def test_write_pipelined_raises_write_error() -> None:
+    def write(chunk: bytes | memoryview) -> None:
+        raise OSError("No space left on device")
+
+    with pytest.raises(OSError, match="No space left"):
+        _write_pipelined(chunks=[b"a"] * 10, write=write, depth=2)
+
+
+def test_write_pipelined_returns_buffers() -> None:
+    buffers: queue.Queue[bytearray] = queue.Queue()
+    for _ in range(3):
+        buffers.put(bytearray(4))
+
+    def chunks() -> Iterator[memoryview]:
+        for i in range(10):
+            buffer = buffers.get(timeout=1)
+            buffer[:] = bytes([i]) * 4
+            yield memoryview(buffer)[:2]
+
+    written: list[bytes] = []
+    _write_pipelined(
+        chunks=chunks(),
+        write=lambda chunk: written.append(bytes(chunk)),
+        depth=1,
+        buffers=buffers,
+    )
+
+    assert written == [bytes([i]) * 2 for i in range(10)]
+    assert buffers.qsize() == 3
+
+
+@pytest.mark.parametrize("pipeline_depth", [0, 2])
+def test_download_reads_body_into_buffers(
+    tmp_path: Path, file_server: FileServer, pipeline_depth: int
+) -> None:
+    digests = {"sha256": ""}
+    with requests.Session() as sess:
+        for name in ["out1", "out2"]:
+            download(
+                url=file_server.url,
+                output=str(tmp_path / name),
+                quiet=True,
+                session=sess,
+                digests=digests,
+                pipeline_depth=pipeline_depth,
+            )
+            assert (tmp_path / name).read_bytes() == file_server.data
+
+    expected = hashlib.sha256(file_server.data).hexdigest()
+    assert digests == {"sha256": f"sha256:{expected}"}
+    # The connection is reused although the body is read past urllib3.
+    assert len(set(file_server.client_ports)) == 1
+
+
+def test_download_resumes_body_cut_short(
+    tmp_path: Path, file_server: FileServer
+) -> None:
+    file_server.truncate.append(True)
+    attempts: list[dict[str, object]] = []
+
+    with unittest.mock.patch("time.sleep"):
+        download(
+            url=file_server.url,
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            retries=1,
+            attempts=attempts,
+        )
+
+    assert (tmp_path / "out").read_bytes() == file_server.data
+    assert isinstance(attempts[0]["error"], requests.exceptions.ChunkedEncodingError)
+    assert attempts[1]["start"] == len(file_server.data) // 2
+
+
+def test_download_stop_ends_retry_wait(tmp_path: Path, file_server: FileServer) -> None:
+    file_server.truncate.append(True)
+    stop = threading.Event()
+    threading.Timer(0.1, stop.set).start()
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download"], "_get_retry_delay", return_value=60
+        ),
+        pytest.raises(DownloadError, match="cancelled"),
+    ):
+        download(
+            url=file_server.url,
+            output=str(tmp_path / "out"),
+            quiet=True,
+            use_cookies=False,
+            retries=1,
+            stop=stop,
+        )
+    assert not (tmp_path / "out").exists()
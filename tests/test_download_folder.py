@@ -1,15 +1,24 @@
+import datetime
 import os.path as osp
 import sys
 import tempfile
+import threading
 import unittest.mock
 from pathlib import Path
 
 import pytest
 
+from gdown.download import GoogleDriveFileToDownload
 from gdown.download_folder import _GoogleDriveFile
+from gdown.download_folder import _iter_directory_structure
+from gdown.download_folder import _iter_google_drive_folders
 from gdown.download_folder import _parse_embedded_folder_view
 from gdown.download_folder import download_folder
+from gdown.download_folder import iter_folder
 from gdown.exceptions import DownloadError
+from gdown.stat import FileStat
+
+from .conftest import fake_parse_embedded_folder_view
 
 here = osp.dirname(osp.abspath(__file__))
 
@@ -51,8 +60,8 @@ def test_root_folder_name_path_traversal_is_sanitized(tmp_path: Path) -> None:
 
     with unittest.mock.patch.object(
         sys.modules["gdown.download_folder"],
-        "_download_and_parse_google_drive_link",
-        return_value=root,
+        "_parse_embedded_folder_view",
+        side_effect=fake_parse_embedded_folder_view(root),
     ):
         files = download_folder(
             url="https://drive.google.com/drive/folders/dummy",
@@ -73,8 +82,8 @@ def test_download_folder_propagates_download_error(tmp_path: Path) -> None:
     with (
         unittest.mock.patch.object(
             sys.modules["gdown.download_folder"],
-            "_download_and_parse_google_drive_link",
-            return_value=root,
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
         ),
         unittest.mock.patch.object(
             sys.modules["gdown.download_folder"],
@@ -161,3 +170,366 @@ def test_download_folder_dry_run() -> None:
         assert hasattr(file, "id")
         assert hasattr(file, "path")
         assert hasattr(file, "local_path")
+
+
+def test_download_folder_parallel_collects_errors(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id=f"id_{i}", name=f"file_{i}.txt", type="text/plain")
+            for i in range(8)
+        ],
+    )
+
+    def fake_download(url: str, output: str, **kwargs: object) -> str:
+        if url.endswith("id_3"):
+            raise DownloadError("access denied")
+        return output
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=fake_download,
+        ) as mock_download,
+        pytest.raises(DownloadError, match="file_3.txt: access denied"),
+    ):
+        download_folder(
+            url="https://drive.google.com/drive/folders/dummy",
+            output=str(tmp_path) + osp.sep,
+            quiet=True,
+            max_workers=4,
+        )
+    assert mock_download.call_count == 8
+
+
+def test_download_folder_parallel_keeps_order(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id=f"id_{i}", name=f"file_{i}.txt", type="text/plain")
+            for i in range(8)
+        ],
+    )
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=lambda url, output, **kwargs: output,
+        ),
+    ):
+        files = download_folder(
+            url="https://drive.google.com/drive/folders/dummy",
+            output=str(tmp_path) + osp.sep,
+            quiet=True,
+            max_workers=4,
+        )
+
+    assert files == [
+        osp.join(str(tmp_path), "folder", f"file_{i}.txt") for i in range(8)
+    ]
+
+
+def test_iter_google_drive_folders_fetches_each_folder_once() -> None:
+    folder = _GoogleDriveFile.TYPE_FOLDER
+    pages = {
+        "root_id": ("root", [("a_id", "a", folder), ("b_id", "b", folder)]),
+        "a_id": ("a", [("a.txt_id", "a.txt", "text/plain"), ("c_id", "c", folder)]),
+        # b holds a shortcut to c and a shortcut back to root.
+        "b_id": ("b", [("c_id", "c", folder), ("root_id", "root", folder)]),
+        "c_id": ("c", [("c.txt_id", "c.txt", "text/plain")]),
+    }
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download_folder"],
+        "_parse_embedded_folder_view",
+        side_effect=lambda sess, folder_id, verify: pages[folder_id],
+    ) as mock_parse:
+        folders = _iter_google_drive_folders(
+            sess=unittest.mock.Mock(), folder_id="root_id", quiet=True, max_workers=4
+        )
+        root = next(folders)
+        structure = sorted(_iter_directory_structure(root, folders))
+
+    assert sorted(c.kwargs["folder_id"] for c in mock_parse.call_args_list) == sorted(
+        pages
+    )
+    assert root.name == "root"
+    assert [(id, path) for _, id, path in structure] == [
+        (None, "a"),
+        ("a.txt_id", osp.join("a", "a.txt")),
+        (None, osp.join("a", "c")),
+        ("c.txt_id", osp.join("a", "c", "c.txt")),
+        (None, "b"),
+        (None, osp.join("b", "c")),
+        ("c.txt_id", osp.join("b", "c", "c.txt")),
+    ]
+
+
+def test_iter_folder_yields_files(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(
+                id="sub_id",
+                name="sub",
+                type=_GoogleDriveFile.TYPE_FOLDER,
+                children=[_GoogleDriveFile(id="b_id", name="b.txt", type="text/plain")],
+            ),
+            _GoogleDriveFile(id="a_id", name="a.txt", type="text/plain"),
+        ],
+    )
+
+    with unittest.mock.patch.object(
+        sys.modules["gdown.download_folder"],
+        "_parse_embedded_folder_view",
+        side_effect=fake_parse_embedded_folder_view(root),
+    ):
+        files = list(iter_folder(id="root_id", output=str(tmp_path), quiet=True))
+
+    # Files of the root arrive before those of its subfolders.
+    assert files == [
+        GoogleDriveFileToDownload(
+            id="a_id", path="a.txt", local_path=osp.join(str(tmp_path), "a.txt")
+        ),
+        GoogleDriveFileToDownload(
+            id="b_id",
+            path=osp.join("sub", "b.txt"),
+            local_path=osp.join(str(tmp_path), "sub", "b.txt"),
+        ),
+    ]
+
+
+def test_download_folder_shares_session_across_files(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id=f"id_{i}", name=f"file_{i}.txt", type="text/plain")
+            for i in range(3)
+        ],
+    )
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=lambda url, output, **kwargs: output,
+        ) as mock_download,
+    ):
+        download_folder(
+            url="https://drive.google.com/drive/folders/dummy",
+            output=str(tmp_path) + osp.sep,
+            quiet=True,
+            use_cookies=False,
+        )
+
+    sessions = {id(c.kwargs["session"]) for c in mock_download.call_args_list}
+    assert len(sessions) == 1
+
+
+def test_download_folder_sync(tmp_path: Path) -> None:
+    files = {"a_id": ("a.txt", 1), "b_id": ("b.txt", 1)}
+
+    def fake_stat(id: str, **kwargs: object) -> FileStat:
+        name, version = files[id]
+        return FileStat(
+            id=id,
+            name=name,
+            size=version,
+            modified_time=datetime.datetime(2020, 1, version),
+            accept_ranges=True,
+        )
+
+    def fake_download(url: str, output: str, **kwargs: object) -> str:
+        name, version = files[url.split("=")[-1]]
+        Path(output).write_bytes(b"x" * version)
+        return output
+
+    def sync(prune: bool = False) -> list[str]:
+        root = _GoogleDriveFile(
+            id="root_id",
+            name="folder",
+            type=_GoogleDriveFile.TYPE_FOLDER,
+            children=[
+                _GoogleDriveFile(id=id, name=name, type="text/plain")
+                for id, (name, _) in files.items()
+            ],
+        )
+        with unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ):
+            download_folder(
+                id="root_id",
+                output=str(tmp_path),
+                quiet=True,
+                use_cookies=False,
+                sync=True,
+                prune=prune,
+            )
+        return [c.kwargs["url"] for c in mock_download.call_args_list]
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"], "stat", side_effect=fake_stat
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=fake_download,
+        ) as mock_download,
+    ):
+        assert len(sync()) == 2
+        mock_download.reset_mock()
+        assert sync() == []
+
+        files["b_id"] = ("b.txt", 2)
+        assert sync() == ["https://drive.google.com/uc?id=b_id"]
+        mock_download.reset_mock()
+
+        del files["a_id"]
+        assert sync() == []
+        assert (tmp_path / "a.txt").exists()
+        sync(prune=True)
+        assert not (tmp_path / "a.txt").exists()
+
+        # The local copy of a renamed file is pruned as well.
+        files["b_id"] = ("c.txt", 2)
+        sync(prune=True)
+
+    assert not (tmp_path / "b.txt").exists()
+    assert (tmp_path / "c.txt").read_bytes() == b"xx"
+
+
+def test_download_folder_resumes_from_journal(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id="a_id", name="a.txt", type="text/plain"),
+            _GoogleDriveFile(id="b_id", name="b.txt", type="text/plain"),
+        ],
+    )
+    failing = {"b_id"}
+
+    def fake_download(url: str, output: str, **kwargs: object) -> str:
+        if url.split("=")[-1] in failing:
+            raise DownloadError("connection reset")
+        return output
+
+    journal_path = tmp_path / "folder" / ".gdown-journal.jsonl"
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse_embedded_folder_view(root),
+        ) as mock_parse,
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=fake_download,
+        ) as mock_download,
+    ):
+        with pytest.raises(DownloadError):
+            download_folder(id="root_id", output=str(tmp_path / "folder"), quiet=True)
+        # A crash while writing a record leaves a truncated line.
+        with open(journal_path, "a") as f:
+            f.write('{"done": "b.t')
+
+        mock_parse.reset_mock()
+        mock_download.reset_mock()
+        failing.clear()
+        files = download_folder(
+            id="root_id", output=str(tmp_path / "folder"), quiet=True, resume=True
+        )
+
+    mock_parse.assert_not_called()
+    assert [c.kwargs["url"] for c in mock_download.call_args_list] == [
+        "https://drive.google.com/uc?id=b_id"
+    ]
+    assert files == [
+        osp.join(str(tmp_path), "folder", "a.txt"),
+        osp.join(str(tmp_path), "folder", "b.txt"),
+    ]
+    assert not journal_path.exists()
+
+
+def test_download_folder_stops_downloads_when_listing_fails(tmp_path: Path) -> None:
+    root = _GoogleDriveFile(
+        id="root_id",
+        name="folder",
+        type=_GoogleDriveFile.TYPE_FOLDER,
+        children=[
+            _GoogleDriveFile(id="a_id", name="a.txt", type="text/plain"),
+            _GoogleDriveFile(
+                id="sub_id", name="sub", type=_GoogleDriveFile.TYPE_FOLDER
+            ),
+        ],
+    )
+    parse = fake_parse_embedded_folder_view(root)
+    started = threading.Event()
+    running = threading.Event()
+
+    def fake_parse(
+        sess: object, folder_id: str, verify: bool = True
+    ) -> tuple[str, list[tuple[str, str, str]]]:
+        if folder_id == "sub_id":
+            assert started.wait(timeout=5)
+            raise DownloadError("listing failed")
+        return parse(sess, folder_id, verify)
+
+    def fake_download(
+        url: str, output: str, stop: threading.Event, **kwargs: object
+    ) -> str:
+        running.set()
+        started.set()
+        try:
+            # Waits to retry until stopped.
+            assert stop.wait(timeout=5)
+            raise DownloadError("Download cancelled")
+        finally:
+            running.clear()
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "_parse_embedded_folder_view",
+            side_effect=fake_parse,
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.download_folder"],
+            "download",
+            side_effect=fake_download,
+        ),
+        pytest.raises(DownloadError, match="listing failed"),
+    ):
+        download_folder(id="root_id", output=str(tmp_path), quiet=True, max_workers=2)
+
+    assert started.is_set()
+    assert not running.is_set()
@@ -0,0 +1,71 @@
+import asyncio
+import time
+import unittest.mock
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from gdown.speed_limit import SpeedLimiter
+
+
+@pytest.fixture
+def clock() -> Iterator[list[float]]:
+    """Patches time so that sleeping advances it instead of waiting."""
+    now = [1000.0]
+    sleeps: list[float] = []
+
+    def sleep(seconds: float) -> None:
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    with (
+        unittest.mock.patch("time.time", lambda: now[0]),
+        unittest.mock.patch("time.sleep", sleep),
+    ):
+        yield sleeps
+
+
+def test_speed_limiter(clock: list[float]) -> None:
+    limiter = SpeedLimiter(speed=1000, burst=100)
+    limiter.consume(1000)
+    # The bucket starts full, so only the 900 bytes after it are waited for.
+    assert sum(clock) == pytest.approx(0.9)
+    # Each wait is for at most burst bytes.
+    assert max(clock) == pytest.approx(0.1)
+
+
+def test_speed_limiter_aconsume(clock: list[float]) -> None:
+    limiter = SpeedLimiter(speed=1000, burst=100)
+
+    async def sleep(seconds: float) -> None:
+        time.sleep(seconds)
+
+    with unittest.mock.patch("asyncio.sleep", sleep):
+        asyncio.run(limiter.aconsume(1000))
+    assert sum(clock) == pytest.approx(0.9)
+
+
+def test_speed_limiter_shared_between_threads(clock: list[float]) -> None:
+    limiter = SpeedLimiter(speed=1000, burst=100)
+    # Transfers taking tokens at the same time wait in turn for the refill,
+    # so that together they don't exceed the speed.
+    delays = [limiter._take(100) for _ in range(4)]
+    assert delays == pytest.approx([0, 0.1, 0.2, 0.3])
+
+
+def test_speed_limiter_shared_between_processes(
+    tmp_path: Path, clock: list[float]
+) -> None:
+    path = str(tmp_path / "speed.json")
+    limiter1 = SpeedLimiter(speed=1000, burst=100, path=path)
+    limiter2 = SpeedLimiter(speed=1000, burst=100, path=path)
+    limiter1.consume(100)
+    assert sum(clock) == 0
+    limiter2.consume(100)
+    assert sum(clock) == pytest.approx(0.1)
+
+
+def test_speed_limiter_invalid_speed() -> None:
+    with pytest.raises(ValueError):
+        SpeedLimiter(speed=0)
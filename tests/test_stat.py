@@ -0,0 +1,138 @@
+import datetime
+import sys
+import unittest.mock
+from pathlib import Path
+
+import pytest
+
+import gdown
+from gdown.exceptions import FileURLRetrievalError
+from gdown.stat import FileStat
+
+
+def _fake_session(status_code: int, headers: dict[str, str]) -> unittest.mock.Mock:
+    response = unittest.mock.Mock()
+    response.status_code = status_code
+    response.url = "https://drive.usercontent.google.com/download?id=file_id"
+    response.headers = headers
+    sess = unittest.mock.Mock()
+    sess.get.return_value = response
+    return sess
+
+
+def test_stat_requests_first_byte() -> None:
+    sess = _fake_session(
+        206,
+        {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": 'attachment; filename="spam.txt"',
+            "Content-Length": "1",
+            "Content-Range": "bytes 0-0/1234",
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+        },
+    )
+
+    file_stat = gdown.stat(id="file_id", use_cookies=False, session=sess)
+
+    assert file_stat == FileStat(
+        id="file_id",
+        name="spam.txt",
+        size=1234,
+        modified_time=datetime.datetime(
+            2015, 10, 21, 7, 28, tzinfo=datetime.timezone.utc
+        ),
+        accept_ranges=True,
+    )
+    assert sess.get.call_args.kwargs["headers"] == {"Range": "bytes=0-0"}
+    sess.get.return_value.iter_content.assert_not_called()
+    sess.get.return_value.close.assert_called_once()
+
+
+def test_stat_keeps_metadata_only_with_cache_ttl(tmp_path: Path) -> None:
+    sess = _fake_session(
+        206,
+        {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": 'attachment; filename="spam.txt"',
+            "Content-Range": "bytes 0-0/1234",
+        },
+    )
+
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.url_cache"], "url_cache_root", str(tmp_path)
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.stat"], "_stat_cache", {}
+        ) as stat_cache,
+    ):
+        gdown.stat(id="file_id", use_cookies=False, session=sess)
+        assert stat_cache == {}
+        gdown.stat(id="file_id", use_cookies=False, session=sess, cache_ttl=60)
+        assert list(stat_cache) == [("file_id", None)]
+
+
+def test_stat_without_range_support() -> None:
+    sess = _fake_session(200, {"Content-Length": "1234"})
+
+    file_stat = gdown.stat(url="https://example.com/spam.txt", session=sess)
+
+    assert file_stat.id is None
+    assert file_stat.name is None
+    assert file_stat.size == 1234
+    assert not file_stat.accept_ranges
+
+
+def test_stat_raises_on_http_error() -> None:
+    sess = _fake_session(404, {"Content-Type": "text/html"})
+
+    with pytest.raises(FileURLRetrievalError, match="HTTP 404"):
+        gdown.stat(url="https://example.com/spam.txt", session=sess)
+
+
+def test_stat_many_keeps_order_and_errors(tmp_path: Path) -> None:
+    def fake_get(url: str, **kwargs: object) -> unittest.mock.Mock:
+        id = url.split("=")[-1]
+        response = unittest.mock.Mock()
+        response.status_code = 404 if id == "missing" else 206
+        response.url = url
+        response.headers = {
+            "Content-Type": "application/octet-stream",
+            "Content-Disposition": f'attachment; filename="{id}.txt"',
+            "Content-Range": f"bytes 0-0/{len(id)}",
+        }
+        return response
+
+    sess = unittest.mock.Mock()
+    sess.get.side_effect = fake_get
+    ids = ["a", "missing", "bbb", "cc"]
+    with (
+        unittest.mock.patch.object(
+            sys.modules["gdown.stat"], "_get_session", return_value=(sess, "")
+        ),
+        unittest.mock.patch.object(
+            sys.modules["gdown.url_cache"], "url_cache_root", str(tmp_path)
+        ),
+        unittest.mock.patch.object(sys.modules["gdown.stat"], "_stat_cache", {}),
+    ):
+        file_stats = gdown.stat_many(
+            ids=ids, max_workers=4, use_cookies=False, cache_ttl=60
+        )
+        assert sess.get.call_count == 4
+        # Probed files are cached, but errors are not.
+        assert gdown.stat_many(ids=ids, use_cookies=False, cache_ttl=60) == [
+            file_stats[0],
+            unittest.mock.ANY,
+            file_stats[2],
+            file_stats[3],
+        ]
+        assert sess.get.call_count == 5
+
+    assert [getattr(s, "name", None) for s in file_stats] == [
+        "a.txt",
+        None,
+        "bbb.txt",
+        "cc.txt",
+    ]
+    assert [getattr(s, "size", None) for s in file_stats] == [1, None, 3, 2]
+    assert isinstance(file_stats[1], FileURLRetrievalError)